@@ -0,0 +1,118 @@
+import os
+import weakref
+import tempfile
+from utils.logger import logger
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Share of max_allowed_packet a single statement may use
+PACKET_RATIO = 0.9
+
+# Connection -> max_allowed_packet, queried once per connection
+packet_sizes = weakref.WeakKeyDictionary()
+
+
+def tsv_value(value):
+    """Format a value for LOAD DATA with the default field/line terminators"""
+    if value is None:
+        return "\\N"
+    text = str(value)
+    return (
+        text.replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r")
+            .replace("\0", "\\0")
+    )
+
+
+class BulkWriter:
+    """
+    Writes rows with chunked multi-row INSERT statements sized to max_allowed_packet.
+
+    Batches of at least "load_threshold" rows are streamed with LOAD DATA LOCAL INFILE
+    into a temporary staging table and merged with a single INSERT ... SELECT.
+    """
+    def __init__(self, cursor, load_threshold=None):
+        self.cursor = cursor
+        if load_threshold is None:
+            load_threshold = int(os.getenv("BULK_LOAD_ROWS", 20000))
+        self.load_threshold = load_threshold
+
+    def packet_limit(self):
+        connection = self.cursor.connection
+        if connection not in packet_sizes:
+            self.cursor.execute("SELECT @@max_allowed_packet")
+            packet_sizes[connection] = int(self.cursor.fetchone()[0])
+        return int(packet_sizes[connection] * PACKET_RATIO)
+
+    def write(self, table, columns, rows, on_duplicate=None):
+        """
+        Insert rows into the table.
+
+        Args:
+            table (str): Table name
+            columns (tuple of str): Column names in row order
+            rows (list of tuple): Values
+            on_duplicate (str): Optional ON DUPLICATE KEY UPDATE assignments
+        """
+        if not rows:
+            return
+        if self.load_threshold and len(rows) >= self.load_threshold:
+            self.load(table, columns, rows, on_duplicate)
+        else:
+            self.insert(table, columns, rows, on_duplicate)
+
+    def insert(self, table, columns, rows, on_duplicate=None):
+        """Multi-row INSERT, split so every statement fits into max_allowed_packet"""
+        prefix = f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+        suffix = f" ON DUPLICATE KEY UPDATE {on_duplicate}" if on_duplicate else ""
+        placeholder = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        limit = self.packet_limit() - len((prefix + suffix).encode())
+
+        chunk = []
+        size = 0
+        for row in rows:
+            value = self.cursor.mogrify(placeholder, row)
+            value_size = len(value.encode()) + 1
+            if chunk and size + value_size > limit:
+                self.cursor.execute(prefix + ",".join(chunk) + suffix)
+                chunk = []
+                size = 0
+            chunk.append(value)
+            size += value_size
+
+        if chunk:
+            self.cursor.execute(prefix + ",".join(chunk) + suffix)
+
+    def load(self, table, columns, rows, on_duplicate=None):
+        """LOAD DATA LOCAL INFILE into a staging table, then a set-based merge"""
+        column_list = ", ".join(columns)
+        staging = f"{table}_staging"
+
+        # Temporary tables neither commit the running transaction nor clash between connections
+        self.cursor.execute(
+            f"CREATE TEMPORARY TABLE IF NOT EXISTS {staging} AS SELECT {column_list} FROM {table} LIMIT 0"
+        )
+        self.cursor.execute(f"DELETE FROM {staging}")
+
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", newline="\n", suffix=".tsv", delete=False) as buffer:
+            for row in rows:
+                buffer.write("\t".join(tsv_value(value) for value in row))
+                buffer.write("\n")
+            path = buffer.name
+
+        try:
+            self.cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s INTO TABLE {staging} CHARACTER SET utf8mb4 ({column_list})",
+                (path,)
+            )
+        finally:
+            os.remove(path)
+
+        suffix = f" ON DUPLICATE KEY UPDATE {on_duplicate}" if on_duplicate else ""
+        self.cursor.execute(
+            f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {staging}{suffix}"
+        )
+        logger.info(f"(✓) Bulk loaded {len(rows)} rows into {table}")
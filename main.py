@@ -1,5 +1,10 @@
+import os
+import time
+import queue
 import argparse
+import threading
 from utils.logger import logger
+from messaging.publisher import create_publisher
 from scrapers.migros import MigrosScraper
 from scrapers.a101 import A101Scraper
 from scrapers.getir import GetirScraper
@@ -7,26 +12,137 @@ from scrapers.getir import GetirScraper
 SCRAPERS = {
         'migros': MigrosScraper,
         'a101': A101Scraper,
-        'getir': GetirScraper 
+        'getir': GetirScraper
 }
 
+# Messages waiting for the publisher, scrapers block when it is full
+QUEUE_SIZE = int(os.getenv("ORCHESTRATOR_QUEUE_SIZE", 100))
+# Seconds to wait for each scraper thread when the orchestrator stops early
+JOIN_TIMEOUT = 10
+
+
+def hand_over(results, item, stop):
+    """
+    Puts an item into the results queue unless the orchestrator is stopping.
+
+    Returns:
+        bool: False when the orchestrator stopped before the item could be queued
+    """
+    while not stop.is_set():
+        try:
+            results.put(item, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def run_scraper(runner, results, stats, stop):
+    """
+    Runs a scraper in its own thread and hands every message to the publishing thread.
+
+    Puts (market, None, None) into the results queue when the scraper is finished,
+    and returns early once the stop event is set.
+    """
+    started = time.monotonic()
+    try:
+        for message in runner.scrape():
+            if not hand_over(results, message, stop):
+                stats["status"] = "stopped"
+                return
+            stats["messages"] += 1
+            stats["items"] += len(message[2])
+        stats["status"] = "ok"
+    except Exception as e:
+        stats["status"] = "failed"
+        logger.error(f"(✗) {runner.market} scraper failed: {e}")
+    finally:
+        stats["seconds"] = time.monotonic() - started
+        hand_over(results, (runner.market, None, None), stop)
+
+
+def orchestrate(names):
+    """
+    Runs the given scrapers concurrently behind one shared RabbitMQ publisher.
+
+    Scrapers keep their own concurrency and rate limits, only the main thread publishes.
+
+    Args:
+        names (list of str): Scraper names from SCRAPERS
+    """
+    publisher = create_publisher()
+    if publisher.channel is None:
+        logger.error("(✗) RabbitMQ connection failed")
+        publisher.close()
+        return
+
+    results = queue.Queue(maxsize=QUEUE_SIZE)
+    stop = threading.Event()
+    stats = {}
+    threads = []
+    started = time.monotonic()
+    for name in names:
+        runner = SCRAPERS[name](publisher=publisher)
+        stats[name] = {"messages": 0, "items": 0, "status": "running", "seconds": 0.0}
+        thread = threading.Thread(target=run_scraper, args=(runner, results, stats[name], stop),
+                                  name=f"{name}-scraper", daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    running = len(threads)
+    try:
+        while running:
+            try:
+                market, topic, payload = results.get(timeout=1)
+            except queue.Empty:
+                # Keeps the connection alive while every scraper is busy
+                publisher.process_events()
+                continue
+
+            if topic is None:
+                running -= 1
+                continue
+            publisher.publish(market, topic, payload)
+    finally:
+        # Scrapers blocked on a full queue would never finish if the publish loop failed
+        stop.set()
+        while True:
+            try:
+                results.get_nowait()
+            except queue.Empty:
+                break
+        for thread in threads:
+            thread.join(JOIN_TIMEOUT)
+            if thread.is_alive():
+                logger.warning(f"(?) {thread.name} is still running, leaving it behind")
+        publisher.close()
+
+    logger.info(f"(✓) Refresh finished in {time.monotonic() - started:.1f}s")
+    for name, market_stats in stats.items():
+        logger.info(
+            f"    {name:<8} {market_stats['status']:<7} {market_stats['seconds']:>8.1f}s "
+            f"messages={market_stats['messages']} items={market_stats['items']}"
+        )
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
     prog='Scraper wrapper',
-    description='Run selected scraper. Options: migros, a101, getir'
+    description='Run selected scrapers. Options: migros, a101, getir, all or a comma separated list'
     )
-    
-    # Choose a single scraper to run (e.g. --scraper a101)
+
+    # Choose one or more scrapers to run (e.g. --scraper a101, --scraper migros,getir, --scraper all)
     parser.add_argument('--scraper', default='getir')
 
     args = parser.parse_args()
 
-    runner = SCRAPERS[args.scraper]()
-
-    if runner.publisher.channel is None:
-        logger.error("(✗) RabbitMQ connection failed")
+    if args.scraper == 'all':
+        names = list(SCRAPERS)
     else:
-        for market, topic, payload in runner.scrape():
-            runner.publisher.publish(market, topic, payload)
+        names = [name.strip() for name in args.scraper.split(',') if name.strip()]
+
+    unknown = [name for name in names if name not in SCRAPERS]
+    if unknown or not names:
+        parser.error(f"unknown scraper: {', '.join(unknown) or args.scraper}")
 
-    runner.publisher.close()
+    orchestrate(names)
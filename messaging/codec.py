@@ -0,0 +1,137 @@
+import os
+import gzip
+import json
+import orjson
+from utils.logger import logger
+from dotenv import load_dotenv
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+load_dotenv()
+
+JSON = "application/json"
+COLUMNAR_JSON = "application/vnd.pricetrack.columnar+json"
+COLUMNAR_MSGPACK = "application/vnd.pricetrack.columnar+msgpack"
+
+FORMATS = {
+    "json": JSON,
+    "columnar": COLUMNAR_JSON,
+    "msgpack": COLUMNAR_MSGPACK
+}
+
+# Bodies smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = int(os.getenv("PAYLOAD_COMPRESS_MIN_BYTES", 1024))
+
+
+def payload_settings():
+    """
+    Returns (content_type, content_encoding) selected by PAYLOAD_FORMAT and PAYLOAD_COMPRESSION,
+    falling back to what is available when msgpack or zstandard are not installed
+    """
+    content_type = FORMATS.get(os.getenv("PAYLOAD_FORMAT", "json").strip().lower(), JSON)
+    if content_type == COLUMNAR_MSGPACK and msgpack is None:
+        logger.warning("(?) msgpack is not installed, using columnar JSON payloads")
+        content_type = COLUMNAR_JSON
+
+    content_encoding = os.getenv("PAYLOAD_COMPRESSION", "none").strip().lower()
+    if content_encoding == "zstd" and zstandard is None:
+        logger.warning("(?) zstandard is not installed, using gzip payloads")
+        content_encoding = "gzip"
+    if content_encoding not in ("gzip", "zstd"):
+        content_encoding = None
+    return content_type, content_encoding
+
+
+def to_columns(data):
+    """
+    Columnar layout of a list of dicts: every key is written once, and columns
+    holding the same value in every row (e.g. "market") are written once as constants.
+    """
+    columns = []
+    for item in data:
+        for key in item:
+            if key not in columns:
+                columns.append(key)
+
+    constants = {}
+    if len(data) > 1:
+        for key in columns:
+            first = data[0].get(key)
+            # Types are compared too, since 1 == True == 1.0
+            if all(type(item.get(key)) is type(first) and item.get(key) == first for item in data):
+                constants[key] = first
+    columns = [key for key in columns if key not in constants]
+
+    return {
+        "columns": columns,
+        "constants": constants,
+        "rows": [[item.get(key) for key in columns] for item in data]
+    }
+
+
+def from_columns(payload):
+    columns = payload["columns"]
+    constants = payload.get("constants") or {}
+    data = []
+    for row in payload["rows"]:
+        item = dict(zip(columns, row))
+        item.update(constants)
+        data.append(item)
+    return data
+
+
+def encode(data, content_type=JSON, content_encoding=None):
+    """
+    Serialize a list of dicts for publishing.
+
+    Returns:
+        tuple: (body, content_encoding), content_encoding is None when the body was left uncompressed
+    """
+    if content_type == COLUMNAR_MSGPACK:
+        body = msgpack.packb(to_columns(data), use_bin_type=True)
+    elif content_type == COLUMNAR_JSON:
+        body = orjson.dumps(to_columns(data))
+    else:
+        body = json.dumps(data, ensure_ascii=False).encode()
+
+    if content_encoding and len(body) >= COMPRESS_MIN_BYTES:
+        if content_encoding == "zstd":
+            body = zstandard.ZstdCompressor().compress(body)
+        else:
+            body = gzip.compress(body, compresslevel=6)
+        return body, content_encoding
+    return body, None
+
+
+def decode(body, content_type=None, content_encoding=None):
+    """
+    Deserialize a message body of any supported format, legacy JSON messages
+    without a content_encoding included.
+
+    Returns:
+        list of dict
+    """
+    if content_encoding == "gzip":
+        body = gzip.decompress(body)
+    elif content_encoding == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd payload received but zstandard is not installed")
+        body = zstandard.ZstdDecompressor().decompress(body)
+    elif content_encoding:
+        raise ValueError(f"Unsupported content encoding: {content_encoding}")
+
+    if content_type == COLUMNAR_MSGPACK:
+        if msgpack is None:
+            raise ValueError("msgpack payload received but msgpack is not installed")
+        return from_columns(msgpack.unpackb(body, raw=False))
+    if content_type == COLUMNAR_JSON:
+        return from_columns(orjson.loads(body))
+    return json.loads(body)
@@ -5,16 +5,28 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-def rabbitmq_connection():
+def connection_parameters():
+    """
+    Build RabbitMQ connection parameters from the environment.
+
+    Returns pika.ConnectionParameters, None if the environment is incomplete
+    """
     try:
         host = os.getenv("RMQ_HOST")
         port = int(os.getenv("RMQ_PORT"))
         user = os.getenv("RMQ_USER")
         password = os.getenv("RMQ_PASSWORD")
         credentials = pika.PlainCredentials(user, password)
-        params = pika.ConnectionParameters(host, port, "/", credentials)
-        
+        return pika.ConnectionParameters(host, port, "/", credentials)
+    except Exception:
+        logger.error(f"(✗) An error occurred while loading environments")
+
+def rabbitmq_connection():
+    params = connection_parameters()
+    if params is None:
+        return None
+    try:
         connection = pika.BlockingConnection(params)
         return connection
-    except:
-        logger.error(f"(✗) An error occurred while loading environments")
+    except Exception as e:
+        logger.error(f"(✗) RabbitMQ connection failed: {e}")
@@ -1,8 +1,26 @@
 import os
-import json
+import signal
+import threading
+import pika
 from messaging.connection import rabbitmq_connection
+from messaging.codec import decode
 from utils.logger import logger
 
+# Rejected deliveries wait RETRY_DELAY_MS in the market's retry queue, then go back to
+# their queue; after MAX_RETRIES they are moved to the market's dead letter queue
+MAX_RETRIES = int(os.getenv("CONSUMER_MAX_RETRIES", 5))
+RETRY_DELAY_MS = int(os.getenv("CONSUMER_RETRY_DELAY_MS", 30000))
+
+# Attempts to create a worker's handlers, e.g. its database connection, before the pool gives up
+START_ATTEMPTS = int(os.getenv("CONSUMER_START_ATTEMPTS", 5))
+
+
+class RequeueError(Exception):
+    """
+    Raised by handlers for failures unrelated to the message itself, e.g. a lost database
+    connection. The delivery is requeued without counting towards MAX_RETRIES.
+    """
+
 
 def get_markets():
     markets = os.getenv("MARKETS")
@@ -16,6 +34,85 @@ def get_markets():
     return market_list
 
 
+def retry_exchange(market):
+    return f"{market}.retry"
+
+
+def dead_exchange(market):
+    return f"{market}.dead"
+
+
+def declare_dead_lettering(channel, market):
+    """
+    Declares the market's retry and dead letter exchanges and queues.
+
+    The retry queue has no consumer: its messages expire after RETRY_DELAY_MS and are
+    dead lettered back to the "scrapers" exchange with their original routing key.
+    """
+    channel.exchange_declare(exchange=retry_exchange(market), exchange_type="direct", durable=True)
+    channel.exchange_declare(exchange=dead_exchange(market), exchange_type="direct", durable=True)
+    channel.queue_declare(
+        queue=f"{market}_retry_queue",
+        durable=True,
+        arguments={"x-message-ttl": RETRY_DELAY_MS, "x-dead-letter-exchange": "scrapers"}
+    )
+    channel.queue_declare(queue=f"{market}_dead_queue", durable=True)
+    for topic in ("product", "price"):
+        channel.queue_bind(exchange=retry_exchange(market), queue=f"{market}_retry_queue", routing_key=f"{market}.{topic}")
+        channel.queue_bind(exchange=dead_exchange(market), queue=f"{market}_dead_queue", routing_key=f"{market}.{topic}")
+
+
+def delivery_count(properties, queue_name):
+    """Number of times the message was rejected from the queue, read from the x-death header"""
+    for death in (properties.headers or {}).get("x-death") or []:
+        if death.get("queue") == queue_name and death.get("reason") == "rejected":
+            return int(death.get("count", 0))
+    return 0
+
+
+def reject(channel, method, properties, body, error, retry=True):
+    """
+    Settles a delivery that could not be handled.
+
+    Rejects it into the market's retry queue until it was retried MAX_RETRIES times,
+    then publishes it to the market's dead letter exchange and acks it once the broker
+    confirmed the copy. Messages that can never succeed, e.g. undecodable ones, skip
+    the retries with retry=False. The channel must be in confirm mode.
+    """
+    market, topic = method.routing_key.split(".", 1)
+    retries = delivery_count(properties, f"{market}_{topic}_queue")
+
+    if retry and retries < MAX_RETRIES:
+        logger.error(f"(✗) Handling {method.routing_key} failed, retry {retries + 1}/{MAX_RETRIES}: {error}")
+        channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+        return
+
+    headers = dict(properties.headers or {})
+    headers["x-error"] = str(error)[:1000]
+    headers["x-retries"] = retries
+    try:
+        channel.basic_publish(
+            exchange=dead_exchange(market),
+            routing_key=method.routing_key,
+            body=body,
+            properties=pika.BasicProperties(
+                delivery_mode=2,
+                content_type=properties.content_type,
+                content_encoding=properties.content_encoding,
+                message_id=properties.message_id,
+                headers=headers
+            ),
+            mandatory=True
+        )
+    except (pika.exceptions.UnroutableError, pika.exceptions.NackError) as e:
+        # Keeps the message in the retry loop rather than losing it
+        logger.error(f"(✗) Dead lettering {method.routing_key} failed, retrying it instead: {e}")
+        channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+        return
+    channel.basic_ack(delivery_tag=method.delivery_tag)
+    logger.error(f"(✗) Handling {method.routing_key} failed after {retries} retries, moved to {market}_dead_queue: {error}")
+
+
 def callback(user_callback):
     def handler(channel, method, properties, body):
         rk = method.routing_key
@@ -26,45 +123,317 @@ def callback(user_callback):
             channel.basic_ack(method.delivery_tag)
             return
         try:
-            data = json.loads(body)
+            data = decode(body, properties.content_type, properties.content_encoding)
+        except Exception as e:
+            reject(channel, method, properties, body, e, retry=False)
+            return
+        try:
             user_callback(market, topic, data)
             channel.basic_ack(delivery_tag=method.delivery_tag)
-        except Exception as e:
-            logger.error(f"(✗) Handling {rk} failed: {e}")
+        except RequeueError as e:
+            logger.error(f"(✗) Handling {rk} failed, requeued: {e}")
             channel.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+        except Exception as e:
+            reject(channel, method, properties, body, e)
     return handler
 
 
-def start_consumers(user_callback):
-    connection = rabbitmq_connection()
-    if not connection:
-        logger.error("(✗) RabbitMQ connection failed")
-        return
+class Batcher:
+    """
+    Buffers deliveries until "batch_size" messages or "batch_ms" milliseconds,
+    then hands them to batch_callback as one batch and acks them all at once.
+
+    If the batch fails, its messages are retried one by one with user_callback
+    so that only the failing ones are rejected.
+    """
+    def __init__(self, connection, channel, user_callback, batch_callback, batch_size, batch_ms):
+        self.connection = connection
+        self.channel = channel
+        self.user_callback = user_callback
+        self.batch_callback = batch_callback
+        self.batch_size = batch_size
+        self.batch_ms = batch_ms
+        self.buffer = []
+        self.timer = None
+
+    def handler(self, channel, method, properties, body):
+        rk = method.routing_key
+        try:
+            market, topic = rk.split(".", 1)
+        except ValueError:
+            logger.warning(f"(?) Invalid routing_key: {rk}")
+            channel.basic_ack(method.delivery_tag)
+            return
+        try:
+            data = decode(body, properties.content_type, properties.content_encoding)
+        except Exception as e:
+            reject(channel, method, properties, body, e, retry=False)
+            return
+
+        self.buffer.append((method, properties, body, market, topic, data))
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+        elif self.timer is None:
+            self.timer = self.connection.call_later(self.batch_ms / 1000, self.on_timer)
+
+    def on_timer(self):
+        self.timer = None
+        self.flush()
+
+    def flush(self):
+        if self.timer is not None:
+            self.connection.remove_timeout(self.timer)
+            self.timer = None
+        if not self.buffer:
+            return
+
+        batch, self.buffer = self.buffer, []
+        # Every earlier delivery on this channel is already settled, so the
+        # last tag settles exactly this batch, or the rest of it
+        last_tag = batch[-1][0].delivery_tag
+        try:
+            self.batch_callback([(market, topic, data) for _, _, _, market, topic, data in batch])
+            self.channel.basic_ack(delivery_tag=last_tag, multiple=True)
+        except RequeueError as e:
+            logger.error(f"(✗) Batch of {len(batch)} messages failed, requeued: {e}")
+            self.channel.basic_nack(delivery_tag=last_tag, multiple=True, requeue=True)
+        except Exception as e:
+            logger.error(f"(✗) Batch of {len(batch)} messages failed, retrying one by one: {e}")
+            for method, properties, body, market, topic, data in batch:
+                try:
+                    self.user_callback(market, topic, data)
+                    self.channel.basic_ack(delivery_tag=method.delivery_tag)
+                except RequeueError as e:
+                    logger.error(f"(✗) Handling {method.routing_key} failed, requeued the rest of the batch: {e}")
+                    self.channel.basic_nack(delivery_tag=last_tag, multiple=True, requeue=True)
+                    return
+                except Exception as e:
+                    reject(self.channel, method, properties, body, e)
+
+
+def queue_groups(grouping="market"):
+    """
+    Returns lists of (market, topic) queues that must be consumed together.
+
+    With "market" grouping a market's product and price queues stay on one channel,
+    so batches keep writing products before their prices; "queue" splits them, and a
+    price message whose products are not written yet is retried through the retry queue.
+    """
+    if grouping == "queue":
+        return [[(market, topic)] for market in get_markets() for topic in ("product", "price")]
+    return [[(market, "product"), (market, "price")] for market in get_markets()]
+
+
+def open_channel(connection, queues, user_callback, batch_callback=None):
+    """
+    Opens a channel consuming the given (market, topic) queues.
+
+    Returns (channel, batcher), batcher is None when batching is disabled
+    """
+    prefetch = int(os.getenv("CONSUMER_PREFETCH", 1))
+    batch_size = int(os.getenv("CONSUMER_BATCH_SIZE", 1))
+    batch_ms = int(os.getenv("CONSUMER_BATCH_MS", 500))
 
     channel = connection.channel()
-    channel.basic_qos(prefetch_count=1) 
-
-    for market in get_markets():
-        for topic in ("product", "price"):
-            routing_key = f"{market}.{topic}"
-            queue_name  = f"{market}_{topic}_queue"
-
-            channel.queue_declare(queue=queue_name, durable=True)
-            channel.queue_bind(
-                exchange="scrapers",
-                queue=queue_name,
-                routing_key=routing_key
-            )
-
-            channel.basic_consume(
-                queue=queue_name,
-                on_message_callback=callback(user_callback),
-                auto_ack=False
-            )
+    # Dead letter copies are published on this channel and must be confirmed before the ack
+    channel.confirm_delivery()
+
+    batcher = None
+    if batch_callback is not None and batch_size > 1:
+        batcher = Batcher(connection, channel, user_callback, batch_callback, batch_size, batch_ms)
+        prefetch = max(prefetch, batch_size)
+        logger.info(f"(✓) Batching enabled: size={batch_size}, window={batch_ms}ms")
+
+    channel.basic_qos(prefetch_count=prefetch) 
+
+    for market in dict.fromkeys(market for market, topic in queues):
+        declare_dead_lettering(channel, market)
+
+    for market, topic in queues:
+        routing_key = f"{market}.{topic}"
+        queue_name  = f"{market}_{topic}_queue"
+
+        channel.queue_declare(
+            queue=queue_name,
+            durable=True,
+            arguments={"x-dead-letter-exchange": retry_exchange(market)}
+        )
+        channel.queue_bind(
+            exchange="scrapers",
+            queue=queue_name,
+            routing_key=routing_key
+        )
+
+        channel.basic_consume(
+            queue=queue_name,
+            on_message_callback=batcher.handler if batcher else callback(user_callback),
+            auto_ack=False
+        )
 
+    return channel, batcher
+
+
+def run_channel(connection, channel, batcher):
+    """Consumes until stop_consuming, then flushes the batch and closes the connection"""
     try:
         channel.start_consuming()
     except Exception as e:
         logger.error(f"(✗) Consuming failed because of: {e}")
     finally:
-        connection.close()
+        if batcher and channel.is_open:
+            batcher.flush()
+        if not connection.is_closed:
+            connection.close()
+
+
+def start_consumers(user_callback, batch_callback=None):
+    """
+    Consumes every market's product and price queues with user_callback(market, topic, data).
+
+    If batch_callback is given and CONSUMER_BATCH_SIZE is greater than 1, deliveries
+    are accumulated and written with batch_callback([(market, topic, data), ...]).
+    """
+    connection = rabbitmq_connection()
+    if not connection:
+        logger.error("(✗) RabbitMQ connection failed")
+        return
+
+    queues = [queue for group in queue_groups() for queue in group]
+    channel, batcher = open_channel(connection, queues, user_callback, batch_callback)
+    run_channel(connection, channel, batcher)
+
+
+class ConsumerWorker(threading.Thread):
+    """
+    Consumes its queues on its own RabbitMQ connection with callbacks, and usually
+    a database connection, created by handler_factory inside the thread.
+
+    A worker that cannot start, or stops consuming without being asked to, sets
+    "failed" and calls on_failure so the pool can stop as a whole.
+    """
+    def __init__(self, name, queues, handler_factory, on_failure=None):
+        super().__init__(name=name)
+        self.queues = queues
+        self.handler_factory = handler_factory
+        self.on_failure = on_failure
+        self.connection = None
+        self.channel = None
+        self.stopping = threading.Event()
+        self.failed = False
+
+    def start_handlers(self):
+        """
+        Calls handler_factory up to START_ATTEMPTS times with a doubling delay.
+
+        Returns the handlers, None when every attempt failed or the worker was stopped
+        """
+        delay = 1
+        for attempt in range(1, START_ATTEMPTS + 1):
+            try:
+                return self.handler_factory()
+            except Exception as e:
+                logger.error(f"(✗) {self.name} could not be started ({attempt}/{START_ATTEMPTS}): {e}")
+            if attempt == START_ATTEMPTS or self.stopping.wait(delay):
+                return None
+            delay *= 2
+
+    def fail(self):
+        self.failed = True
+        if self.on_failure is not None:
+            self.on_failure(self)
+
+    def run(self):
+        handlers = self.start_handlers()
+        if handlers is None:
+            if not self.stopping.is_set():
+                self.fail()
+            return
+        user_callback, batch_callback, close = handlers
+
+        try:
+            self.connection = rabbitmq_connection()
+            if not self.connection:
+                logger.error(f"(✗) {self.name}: RabbitMQ connection failed")
+                self.fail()
+                return
+
+            channel, batcher = open_channel(self.connection, self.queues, user_callback, batch_callback)
+            self.channel = channel
+            if self.stopping.is_set():
+                self.connection.close()
+                return
+
+            queue_names = ", ".join(f"{market}.{topic}" for market, topic in self.queues)
+            logger.info(f"(✓) {self.name} consuming {queue_names}")
+            run_channel(self.connection, channel, batcher)
+            if not self.stopping.is_set():
+                logger.error(f"(✗) {self.name} stopped consuming unexpectedly")
+                self.fail()
+        finally:
+            close()
+            logger.info(f"(✓) {self.name} stopped")
+
+    def stop(self):
+        """Thread-safe, lets the message in progress finish and flushes the batch"""
+        self.stopping.set()
+        connection = self.connection
+        if self.channel is not None and connection is not None and connection.is_open:
+            connection.add_callback_threadsafe(self.channel.stop_consuming)
+
+
+def start_workers(handler_factory, workers=None, grouping=None):
+    """
+    Consumes the queues with a pool of threads, each with its own connection and channel.
+
+    Queue groups (see queue_groups) are spread over at most CONSUMER_WORKERS workers,
+    one group is never split across workers. SIGTERM and SIGINT stop the workers
+    gracefully. When a worker fails, every worker is stopped, so no queue is left
+    without a consumer while the process keeps running.
+
+    Args:
+        handler_factory (callable): Called once in every worker, returns
+            (user_callback, batch_callback, close) where batch_callback may be None
+            and close releases the worker's resources
+        workers (int): Number of workers, CONSUMER_WORKERS by default
+        grouping (str): "market" or "queue", CONSUMER_GROUPING by default
+
+    Returns:
+        bool: False when the pool was stopped because a worker failed
+    """
+    workers = workers or int(os.getenv("CONSUMER_WORKERS", 1))
+    grouping = grouping or os.getenv("CONSUMER_GROUPING", "market").strip().lower()
+
+    groups = queue_groups(grouping)
+    count = max(1, min(workers, len(groups)))
+    assignments = [[] for _ in range(count)]
+    for index, group in enumerate(groups):
+        assignments[index % count].extend(group)
+
+    def stop_pool(worker):
+        logger.error(f"(✗) {worker.name} failed, stopping {len(pool)} consumer workers")
+        for other in pool:
+            other.stop()
+
+    pool = [
+        ConsumerWorker(f"consumer-{index}", queues, handler_factory, on_failure=stop_pool)
+        for index, queues in enumerate(assignments)
+    ]
+
+    def shutdown(signum, frame):
+        logger.info(f"(✓) Signal {signum} received, stopping {len(pool)} consumer workers")
+        for worker in pool:
+            worker.stop()
+
+    previous = {sig: signal.signal(sig, shutdown) for sig in (signal.SIGTERM, signal.SIGINT)}
+    try:
+        for worker in pool:
+            worker.start()
+        # Joining with a timeout keeps the main thread responsive to signals
+        while any(worker.is_alive() for worker in pool):
+            for worker in pool:
+                worker.join(timeout=1)
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+
+    return not any(worker.failed for worker in pool)
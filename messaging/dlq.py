@@ -0,0 +1,106 @@
+import argparse
+import pika
+from messaging.connection import rabbitmq_connection
+from messaging.codec import decode
+from messaging.consumer import get_markets
+from utils.logger import logger
+
+
+def dead_queue(market):
+    return f"{market}_dead_queue"
+
+
+def inspect(channel, market, limit):
+    """Prints up to "limit" dead letters of a market and leaves them in the queue"""
+    tags = []
+    for _ in range(limit):
+        method, properties, body = channel.basic_get(queue=dead_queue(market), auto_ack=False)
+        if method is None:
+            break
+        tags.append(method.delivery_tag)
+
+        headers = properties.headers or {}
+        try:
+            items = f"items={len(decode(body, properties.content_type, properties.content_encoding))}"
+        except Exception as e:
+            items = f"undecodable: {e}"
+        print(
+            f"{method.routing_key:<16} retries={headers.get('x-retries', 0)} bytes={len(body)} {items}\n"
+            f"    error: {headers.get('x-error', '-')}"
+        )
+
+    if tags:
+        channel.basic_nack(delivery_tag=tags[-1], multiple=True, requeue=True)
+    print(f"{market}: {len(tags)} dead letters shown")
+
+
+def replay(channel, market, limit):
+    """
+    Publishes up to "limit" dead letters of a market back to the scrapers exchange with
+    a fresh retry count. The channel must be in confirm mode.
+    """
+    replayed = 0
+    while limit is None or replayed < limit:
+        method, properties, body = channel.basic_get(queue=dead_queue(market), auto_ack=False)
+        if method is None:
+            break
+
+        headers = {
+            key: value for key, value in (properties.headers or {}).items()
+            if key not in ("x-death", "x-error", "x-retries")
+        }
+        try:
+            channel.basic_publish(
+                exchange="scrapers",
+                routing_key=method.routing_key,
+                body=body,
+                properties=pika.BasicProperties(
+                    delivery_mode=2,
+                    content_type=properties.content_type,
+                    content_encoding=properties.content_encoding,
+                    message_id=properties.message_id,
+                    headers=headers
+                ),
+                mandatory=True
+            )
+        except (pika.exceptions.UnroutableError, pika.exceptions.NackError) as e:
+            channel.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+            logger.error(f"(✗) Replay of {method.routing_key} failed: {e}")
+            break
+        channel.basic_ack(delivery_tag=method.delivery_tag)
+        replayed += 1
+
+    logger.info(f"(✓) {market}: {replayed} dead letters replayed")
+
+
+def purge(channel, market):
+    frame = channel.queue_purge(queue=dead_queue(market))
+    logger.info(f"(✓) {market}: {frame.method.message_count} dead letters purged")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m messaging.dlq",
+        description="Inspect, replay or purge the dead letter queues of the storage consumer"
+    )
+    parser.add_argument("action", choices=("inspect", "replay", "purge"))
+    parser.add_argument("--market", help="Only this market (default: every market in MARKETS)")
+    parser.add_argument("--limit", type=int, default=None,
+                        help="Max messages to inspect (default 20) or replay (default all)")
+    args = parser.parse_args()
+
+    connection = rabbitmq_connection()
+    if not connection:
+        logger.error("(✗) RabbitMQ connection failed")
+    else:
+        channel = connection.channel()
+        if args.action == "replay":
+            channel.confirm_delivery()
+        for market in [args.market] if args.market else get_markets():
+            if args.action == "inspect":
+                inspect(channel, market, args.limit or 20)
+            elif args.action == "replay":
+                replay(channel, market, args.limit)
+            else:
+                purge(channel, market)
+        connection.close()
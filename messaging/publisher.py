@@ -1,41 +1,243 @@
-import json
+import os
+import itertools
+import threading
+import functools
 import pika
-from .connection import rabbitmq_connection
+from pika.spec import Basic
+from .connection import rabbitmq_connection, connection_parameters
+from .codec import encode, payload_settings
 from utils.logger import logger
+from dotenv import load_dotenv
+
+load_dotenv()
 
 
 class RabbitPublisher:
     def __init__(self):
+        self.content_type, self.content_encoding = payload_settings()
         self.connection = rabbitmq_connection()
         if not self.connection:
             self.channel = None
-        else:   
+        else:
             self.channel = self.connection.channel()
 
     def publish(self, market, topic , data):
         if not self.channel:
             logger.warning(f"(✗) No channel to publish")
             return
-        
+
         routing_key=f"{market}.{topic}"
-        
+
         try:
-            payload = json.dumps(data, ensure_ascii=False)
+            payload, content_encoding = encode(data, self.content_type, self.content_encoding)
             self.channel.basic_publish(
                 exchange="scrapers",
                 routing_key=routing_key,
                 body=payload,
                 properties=pika.BasicProperties(
                     delivery_mode=2,
-                    content_type="application/json"
+                    content_type=self.content_type,
+                    content_encoding=content_encoding
                 )
             )
             logger.info(f"(✓) {topic.title()} collection has been published to {routing_key} queue")
         except Exception as e:
             logger.error(f"(✗) Publish failed for {routing_key}: {e}")
 
+    def process_events(self):
+        """Serve heartbeats while the caller has nothing to publish"""
+        if self.connection and self.connection.is_open:
+            self.connection.process_data_events(time_limit=0)
+
     def close(self):
         if self.connection and not self.connection.is_closed:
             self.connection.close()
             logger.info("(✓) RabbitMQ connection closed.")
-            
\ No newline at end of file
+
+
+class ConfirmPublisher:
+    """
+    Publisher with publisher confirms that does not wait for a round-trip per message.
+
+    A SelectConnection runs in a background I/O loop thread, publish() only hands
+    the message over and blocks when "window" messages are still unconfirmed.
+    Nacked and unroutable (returned) messages are published again up to
+    "max_retries" times, close() waits until the window is empty.
+    """
+    def __init__(self, window=None, max_retries=None, retry_delay=None, timeout=None):
+        self.window = window or int(os.getenv("PUBLISHER_WINDOW", 256))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("PUBLISHER_MAX_RETRIES", 5))
+        self.retry_delay = retry_delay if retry_delay is not None else float(os.getenv("PUBLISHER_RETRY_DELAY", 1))
+        self.timeout = timeout or float(os.getenv("PUBLISHER_TIMEOUT", 30))
+        self.content_type, self.content_encoding = payload_settings()
+
+        self.channel = None
+        self.connection = None
+        self.ready = threading.Event()
+        self.condition = threading.Condition()
+        self.pending = 0
+        self.message_ids = itertools.count(1)
+
+        # Only touched by the I/O loop thread
+        self.delivery_tags = itertools.count(1)
+        self.unconfirmed = {}
+        self.returned = set()
+
+        params = connection_parameters()
+        if params is None:
+            return
+        self.connection = pika.SelectConnection(
+            params,
+            on_open_callback=self.on_connection_open,
+            on_open_error_callback=self.on_connection_error,
+            on_close_callback=self.on_connection_closed
+        )
+        self.ioloop = self.connection.ioloop
+        self.thread = threading.Thread(target=self.ioloop.start, name="rabbitmq-publisher", daemon=True)
+        self.thread.start()
+
+        if not self.ready.wait(self.timeout) or self.channel is None:
+            logger.error("(✗) RabbitMQ confirm channel could not be opened")
+            self.close()
+
+    def on_connection_open(self, connection):
+        connection.channel(on_open_callback=self.on_channel_open)
+
+    def on_connection_error(self, connection, error):
+        logger.error(f"(✗) RabbitMQ connection failed: {error}")
+        connection.ioloop.stop()
+        self.ready.set()
+
+    def on_connection_closed(self, connection, reason):
+        self.channel = None
+        connection.ioloop.stop()
+        self.abandon(f"connection closed: {reason}")
+        self.ready.set()
+
+    def on_channel_open(self, channel):
+        channel.add_on_close_callback(self.on_channel_closed)
+        channel.add_on_return_callback(self.on_return)
+        channel.confirm_delivery(self.on_confirm, callback=lambda frame: self.on_confirm_mode(channel))
+
+    def on_confirm_mode(self, channel):
+        self.channel = channel
+        self.ready.set()
+
+    def on_channel_closed(self, channel, reason):
+        self.channel = None
+        self.abandon(f"channel closed: {reason}")
+        if channel.connection.is_open:
+            channel.connection.close()
+
+    def abandon(self, reason):
+        """Give up on unconfirmed messages once the channel is gone, so nobody waits forever"""
+        if self.unconfirmed:
+            logger.error(f"(✗) {len(self.unconfirmed)} unconfirmed messages lost, {reason}")
+        self.unconfirmed.clear()
+        with self.condition:
+            self.pending = 0
+            self.condition.notify_all()
+
+    def publish(self, market, topic, data):
+        if not self.channel:
+            logger.warning(f"(✗) No channel to publish")
+            return
+
+        routing_key = f"{market}.{topic}"
+        body, content_encoding = encode(data, self.content_type, self.content_encoding)
+        message = {
+            "routing_key": routing_key,
+            "topic": topic,
+            "body": body,
+            "properties": pika.BasicProperties(
+                delivery_mode=2,
+                content_type=self.content_type,
+                content_encoding=content_encoding,
+                message_id=str(next(self.message_ids))
+            ),
+            "attempts": 0
+        }
+
+        with self.condition:
+            while self.channel and self.pending >= self.window:
+                self.condition.wait()
+            if not self.channel:
+                logger.error(f"(✗) Publish failed for {routing_key}: channel closed")
+                return
+            self.pending += 1
+
+        self.ioloop.add_callback_threadsafe(functools.partial(self.send, message))
+
+    def send(self, message):
+        """Runs on the I/O loop thread"""
+        if not self.channel or not self.channel.is_open:
+            return
+        message["attempts"] += 1
+        self.unconfirmed[next(self.delivery_tags)] = message
+        self.channel.basic_publish(
+            exchange="scrapers",
+            routing_key=message["routing_key"],
+            body=message["body"],
+            properties=message["properties"],
+            mandatory=True
+        )
+
+    def on_return(self, channel, method, properties, body):
+        # basic.return always arrives before the ack of the same message
+        self.returned.add(properties.message_id)
+        logger.warning(f"(✗) Message returned from {method.routing_key}: {method.reply_text}")
+
+    def on_confirm(self, frame):
+        method = frame.method
+        if method.multiple:
+            tags = [tag for tag in self.unconfirmed if tag <= method.delivery_tag]
+        else:
+            tags = [method.delivery_tag]
+
+        done = 0
+        for tag in tags:
+            message = self.unconfirmed.pop(tag, None)
+            if message is None:
+                continue
+            returned = message["properties"].message_id in self.returned
+            self.returned.discard(message["properties"].message_id)
+
+            if isinstance(method, Basic.Ack) and not returned:
+                logger.info(f"(✓) {message['topic'].title()} collection has been confirmed for {message['routing_key']} queue")
+                done += 1
+            elif message["attempts"] <= self.max_retries:
+                delay = self.retry_delay * 2 ** (message["attempts"] - 1)
+                self.ioloop.call_later(delay, functools.partial(self.send, message))
+            else:
+                logger.error(f"(✗) Publish failed for {message['routing_key']} after {message['attempts']} attempts")
+                done += 1
+
+        if done:
+            with self.condition:
+                self.pending -= done
+                self.condition.notify_all()
+
+    def process_events(self):
+        """The I/O loop thread serves heartbeats, nothing to do here"""
+
+    def close(self):
+        """Wait until every message is confirmed or given up, then close the connection"""
+        if self.connection is None:
+            return
+        connection, self.connection = self.connection, None
+
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.pending == 0 or not self.channel, self.timeout):
+                logger.error(f"(✗) {self.pending} messages still unconfirmed on close")
+
+        if not connection.is_closed:
+            self.ioloop.add_callback_threadsafe(connection.close)
+        self.thread.join(self.timeout)
+        logger.info("(✓) RabbitMQ connection closed.")
+
+
+def create_publisher():
+    """Publisher selected by PUBLISHER_CONFIRMS, ConfirmPublisher when enabled"""
+    if os.getenv("PUBLISHER_CONFIRMS", "true").lower() == "true":
+        return ConfirmPublisher()
+    return RabbitPublisher()
@@ -33,9 +33,41 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+    'DEFAULT_RENDERER_CLASSES': (
+        'products.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer'
+    ),
     'PAGE_SIZE': 40
 }
 
+# Prices per product returned by /api/whole/ when prices_limit is not given, and its upper bound
+WHOLE_PRICES_LIMIT = int(os.getenv('WHOLE_PRICES_LIMIT', 30))
+WHOLE_PRICES_MAX_LIMIT = int(os.getenv('WHOLE_PRICES_MAX_LIMIT', 500))
+
+# List responses are cached until the storage consumer bumps the data version,
+# set API_CACHE_BACKEND (e.g. django.core.cache.backends.redis.RedisCache) to share it between workers
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('API_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('API_CACHE_LOCATION', 'pricetrack'),
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('API_CACHE_MAX_ENTRIES', 1000))}
+    }
+}
+API_CACHE_TIMEOUT = int(os.getenv('API_CACHE_TIMEOUT', 86400))
+API_VERSION_TTL = int(os.getenv('API_VERSION_TTL', 1))
+
+# List views serialize .values() rows into plain dicts instead of using ModelSerializer
+API_FAST_SERIALIZATION = os.getenv('API_FAST_SERIALIZATION', 'true').lower() == 'true'
+
+# Rows read per query by /api/export/
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 5000))
+
+# Same flag as storage.py: prices only holds price changes, so /api/history/ has no hour buckets
+PRICE_DEDUP = os.getenv('PRICE_DEDUP', 'true').lower() == 'true'
+
+# ngram_token_size of MySQL, shorter /api/search/ queries use a name prefix match instead
+SEARCH_NGRAM_SIZE = int(os.getenv('SEARCH_NGRAM_SIZE', 2))
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -5,7 +5,12 @@ from products.views import (
     LoginAPIView,
     ProductAPIView,
     PriceAPIView,
-    WholeAPIView
+    WholeAPIView,
+    LatestPriceAPIView,
+    ExportAPIView,
+    HistoryAPIView,
+    CompareAPIView,
+    SearchAPIView
 )
 
 urlpatterns = [
@@ -18,5 +23,15 @@ urlpatterns = [
 
     path('api/products/', ProductAPIView.as_view(), name='product-list'),
 
-    path('api/prices/', PriceAPIView.as_view(), name='price-list')
+    path('api/prices/', PriceAPIView.as_view(), name='price-list'),
+
+    path('api/latest/', LatestPriceAPIView.as_view(), name='latest-price-list'),
+
+    path('api/export/', ExportAPIView.as_view(), name='price-export'),
+
+    path('api/history/', HistoryAPIView.as_view(), name='price-history'),
+
+    path('api/compare/', CompareAPIView.as_view(), name='product-compare'),
+
+    path('api/search/', SearchAPIView.as_view(), name='product-search')
 ]
\ No newline at end of file
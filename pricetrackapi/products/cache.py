@@ -0,0 +1,85 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+from .models import DataVersion
+
+VERSIONS_KEY = 'api:data_versions'
+
+
+def data_versions():
+    """
+    Returns {market: version} as bumped by the storage consumer after every write.
+
+    Versions are kept for API_VERSION_TTL seconds, so a burst of requests costs one tiny query.
+    """
+    versions = cache.get(VERSIONS_KEY)
+    if versions is None:
+        versions = dict(DataVersion.objects.values_list('market', 'version'))
+        if settings.API_VERSION_TTL:
+            cache.set(VERSIONS_KEY, versions, settings.API_VERSION_TTL)
+    return versions
+
+
+def version_token(market=None):
+    """
+    Version of the filtered market, or of every market when the request spans all of them.
+
+    The market is matched like MySQL's case-insensitive collation does, and an unknown
+    market falls back to every market's version, since it is never bumped on its own.
+    """
+    versions = data_versions()
+    if market:
+        market = market.strip().casefold()
+        for name, version in versions.items():
+            if name.strip().casefold() == market:
+                return f"{name}:{version}"
+    return ",".join(f"{name}:{version}" for name, version in sorted(versions.items()))
+
+
+class CachedListMixin:
+    """
+    Caches list responses per endpoint, normalized query parameters and data version,
+    and answers If-None-Match with 304 while the version is unchanged.
+
+    Only views that filter by "market" are keyed on that market's version. Views whose
+    rows span markets regardless of the parameter set market_versioned to False so
+    every market's version is part of the key.
+    """
+    market_versioned = True
+
+    def version_market(self):
+        """The market the response is limited to, or None when it may span every market"""
+        if not self.market_versioned:
+            return None
+        filterset_class = getattr(self, 'filterset_class', None)
+        if filterset_class is not None:
+            fields = filterset_class.base_filters
+        else:
+            fields = getattr(self, 'filterset_fields', None) or ()
+        if 'market' not in fields:
+            return None
+        return self.request.query_params.get('market')
+
+    def list(self, request, *args, **kwargs):
+        params = sorted((key, sorted(request.query_params.getlist(key))) for key in request.query_params)
+        token = version_token(self.version_market())
+        # Host is part of the key because paginated responses carry absolute next/previous links
+        digest = hashlib.sha1(repr((request.get_host(), request.path, params, token)).encode()).hexdigest()
+        etag = f'"{digest}"'
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+
+        if etag in request.headers.get('If-None-Match', ''):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        key = f"api:list:{digest}"
+        data = cache.get(key)
+        if data is None:
+            response = super().list(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data = response.data
+            cache.set(key, data, settings.API_CACHE_TIMEOUT)
+
+        return Response(data, headers=headers)
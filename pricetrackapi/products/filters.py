@@ -0,0 +1,16 @@
+import django_filters
+from .models import LatestPrice
+
+
+class LatestPriceFilter(django_filters.FilterSet):
+    market = django_filters.CharFilter(field_name='product__market')
+    brand = django_filters.CharFilter(field_name='product__brand')
+    tag = django_filters.CharFilter(method='filter_tag')
+
+    class Meta:
+        model = LatestPrice
+        fields = ['market', 'brand', 'tag', 'campaign']
+
+    def filter_tag(self, queryset, name, value):
+        # tags is a list for a101/getir and a plain string for migros, JSON_CONTAINS matches both
+        return queryset.filter(product__tags__contains=value)
@@ -0,0 +1,46 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from products.models import Product, ProductMatch, DataVersion
+from products.matching import match_products
+
+
+class Command(BaseCommand):
+    help = (
+        "Group equivalent products of different markets and replace the product_matches "
+        "table used by /api/compare/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=float, default=0.6,
+                            help='Minimum name similarity (0-1) of matching products.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows per INSERT when writing matches.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Print the group count without writing it.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        products = Product.objects.values_list('product_id', 'product_name', 'brand', 'market')
+        groups = match_products(products.iterator(chunk_size=10000), threshold=options['threshold'])
+        matched = sum(len(group) for group in groups)
+        self.stdout.write(
+            f"Matched {matched} products into {len(groups)} groups in {time.monotonic() - started:.1f}s."
+        )
+        if options['dry_run']:
+            return
+
+        # The smallest product id names the group, so unchanged groups keep their id across runs
+        matches = [
+            ProductMatch(product_id=product_id, group_id=group[0])
+            for group in groups
+            for product_id in group
+        ]
+        with transaction.atomic():
+            ProductMatch.objects.all().delete()
+            ProductMatch.objects.bulk_create(matches, batch_size=options['batch_size'])
+            # Invalidates cached /api/compare/ responses
+            DataVersion.objects.update(version=F('version') + 1)
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(matches)} product matches."))
@@ -0,0 +1,130 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+def month_start(day, offset=0):
+    """First day of the month "offset" months away from the given day"""
+    month = day.month - 1 + offset
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(day):
+    return f"p{day:%Y%m}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Manage monthly RANGE partitions of the prices table: convert it with --setup, "
+        "create upcoming months and drop months older than --retention."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--setup', action='store_true',
+                            help='Partition the prices table by month (drops its foreign key).')
+        parser.add_argument('--ahead', type=int, default=3,
+                            help='Number of upcoming months to keep partitions for.')
+        parser.add_argument('--retention', type=int, default=None,
+                            help='Drop partitions older than this many months.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Print statements without executing them.')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        today = date.today()
+
+        partitions = self.partitions()
+        if options['setup']:
+            if partitions:
+                raise CommandError('prices table is already partitioned.')
+            self.setup(today, options['ahead'])
+            if self.dry_run:
+                return
+            partitions = self.partitions()
+        elif not partitions:
+            raise CommandError('prices table is not partitioned, run with --setup first.')
+
+        self.add_months(partitions, today, options['ahead'])
+        if options['retention'] is not None:
+            self.drop_months(partitions, month_start(today, -options['retention']))
+
+    def execute_sql(self, sql, params=None):
+        self.stdout.write(sql)
+        if not self.dry_run:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+
+    def partitions(self):
+        """Returns monthly partition names of the prices table, oldest first"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT PARTITION_NAME
+                FROM information_schema.PARTITIONS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'prices'
+                AND PARTITION_NAME IS NOT NULL
+                ORDER BY PARTITION_ORDINAL_POSITION
+                """
+            )
+            return [row[0] for row in cursor.fetchall() if row[0] != 'pmax']
+
+    def setup(self, today, ahead):
+        """
+        Partitioned InnoDB tables cannot have foreign keys and every unique key must
+        contain the partitioning column, so the foreign key is dropped and the primary
+        key is extended with price_date before partitioning.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT CONSTRAINT_NAME
+                FROM information_schema.REFERENTIAL_CONSTRAINTS
+                WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = 'prices'
+                """
+            )
+            foreign_keys = [row[0] for row in cursor.fetchall()]
+            cursor.execute("SELECT MIN(price_date) FROM prices")
+            oldest = cursor.fetchone()[0]
+
+        for name in foreign_keys:
+            self.execute_sql(f"ALTER TABLE prices DROP FOREIGN KEY `{name}`")
+        self.execute_sql("ALTER TABLE prices DROP PRIMARY KEY, ADD PRIMARY KEY (price_id, price_date)")
+
+        first = month_start(oldest.date() if oldest else today)
+        last = month_start(today, ahead)
+        definitions = []
+        day = first
+        while day <= last:
+            definitions.append(
+                f"PARTITION {partition_name(day)} VALUES LESS THAN ('{month_start(day, 1):%Y-%m-%d}')"
+            )
+            day = month_start(day, 1)
+        definitions.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+
+        self.execute_sql(
+            "ALTER TABLE prices PARTITION BY RANGE COLUMNS(price_date) (" + ", ".join(definitions) + ")"
+        )
+
+    def add_months(self, partitions, today, ahead):
+        """Split pmax so that the next "ahead" months have their own partitions"""
+        existing = set(partitions)
+        definitions = []
+        for offset in range(ahead + 1):
+            day = month_start(today, offset)
+            if partition_name(day) not in existing and (not partitions or partition_name(day) > partitions[-1]):
+                definitions.append(
+                    f"PARTITION {partition_name(day)} VALUES LESS THAN ('{month_start(day, 1):%Y-%m-%d}')"
+                )
+        if not definitions:
+            return
+        definitions.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+        self.execute_sql("ALTER TABLE prices REORGANIZE PARTITION pmax INTO (" + ", ".join(definitions) + ")")
+
+    def drop_months(self, partitions, cutoff):
+        """Drop partitions whose whole month is before the cutoff month"""
+        expired = [name for name in partitions if name < partition_name(cutoff)]
+        if not expired:
+            self.stdout.write('No partitions to drop.')
+            return
+        self.execute_sql(f"ALTER TABLE prices DROP PARTITION {', '.join(expired)}")
+        self.stdout.write(self.style.SUCCESS(f"Dropped {len(expired)} partitions."))
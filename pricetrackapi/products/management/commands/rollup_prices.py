@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils.dateparse import parse_date
+
+ROLLUP_SQL = """
+INSERT INTO price_daily (
+    product_id, price_day,
+    special_min, special_max, special_sum, special_count,
+    regular_min, regular_max, regular_sum, regular_count,
+    special_last, regular_last, campaign, last_seen
+)
+SELECT
+    product_id, price_day,
+    MIN(special_price), MAX(special_price), COALESCE(SUM(special_price), 0), COUNT(special_price),
+    MIN(regular_price), MAX(regular_price), SUM(regular_price), COUNT(*),
+    MAX(CASE WHEN position = 1 THEN special_price END),
+    MAX(CASE WHEN position = 1 THEN regular_price END),
+    MAX(campaign IS NOT NULL), MAX(price_date)
+FROM (
+    SELECT
+        product_id, DATE(price_date) AS price_day, special_price, regular_price, campaign, price_date,
+        ROW_NUMBER() OVER (
+            PARTITION BY product_id, DATE(price_date) ORDER BY price_date DESC, price_id DESC
+        ) AS position
+    FROM prices
+    WHERE price_date >= %s AND price_date < %s
+) ranked
+WHERE NOT EXISTS (
+    SELECT 1 FROM price_daily existing
+    WHERE existing.product_id = ranked.product_id AND existing.price_day = ranked.price_day
+)
+GROUP BY product_id, price_day
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfill the price_daily rollup from the prices table for history recorded before "
+        "the rollup existed. Product days that already have a rollup row are kept, since the "
+        "storage consumer counts every observation while prices only keeps price changes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', default='1970-01-01',
+                            help='Only backfill days from this date (YYYY-MM-DD) on.')
+        parser.add_argument('--until', required=True,
+                            help='Only backfill days before this date (YYYY-MM-DD), '
+                                 'usually the day PRICE_ROLLUP was enabled.')
+
+    def handle(self, *args, **options):
+        bounds = {}
+        for name in ('since', 'until'):
+            bounds[name] = parse_date(options[name])
+            if bounds[name] is None:
+                raise CommandError(f'--{name} must be a date (YYYY-MM-DD).')
+        if bounds['since'] >= bounds['until']:
+            raise CommandError('--since must be before --until.')
+
+        with connection.cursor() as cursor:
+            cursor.execute(ROLLUP_SQL, [bounds['since'], bounds['until']])
+            count = cursor.rowcount
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rolled up {count} product days from {bounds['since']} until {bounds['until']}."
+        ))
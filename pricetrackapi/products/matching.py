@@ -0,0 +1,209 @@
+import re
+import zlib
+import random
+from collections import defaultdict
+from itertools import combinations
+
+# Turkish dotted/dotless i pairs, str.lower() would turn "I" into "i" and "İ" into "i̇"
+TURKISH_CASEFOLD = str.maketrans({'I': 'ı', 'İ': 'i'})
+# Diacritics are dropped for matching since markets spell "Çikolatalı" and "Cikolatali" alike
+ASCII_FOLD = str.maketrans('çğıöşüâîû', 'cgiosuaiu')
+
+UNITS = {
+    'kg': ('g', 1000),
+    'kilo': ('g', 1000),
+    'gr': ('g', 1),
+    'gram': ('g', 1),
+    'g': ('g', 1),
+    'lt': ('ml', 1000),
+    'litre': ('ml', 1000),
+    'l': ('ml', 1000),
+    'ml': ('ml', 1),
+    'cl': ('ml', 10),
+    'adet': ('adet', 1)
+}
+QUANTITY = re.compile(
+    r'(?:(\d+)\s*[x*]\s*)?(\d+(?:[.,]\d+)?)\s*(' + '|'.join(sorted(UNITS, key=len, reverse=True)) + r')\b'
+)
+TOKEN = re.compile(r'[a-z0-9]+')
+
+# Mersenne prime for the MinHash permutations, small enough to keep products in 64 bits
+MERSENNE = (1 << 31) - 1
+
+# Blocks up to this size are compared pair by pair, MinHash only pays off for larger ones
+SMALL_BLOCK = 8
+
+# Longest brand, in tokens, looked for at the start of product names
+BRAND_TOKENS = 3
+
+
+def casefold(text):
+    """Lowercase with Turkish rules and without diacritics"""
+    return text.translate(TURKISH_CASEFOLD).lower().translate(ASCII_FOLD)
+
+
+def extract_quantity(text):
+    """
+    Find the package size of a casefolded name.
+
+    Returns:
+        tuple: (quantity, text without it), quantity is canonical like "1000ml" or "6x200g", None if not found
+    """
+    match = QUANTITY.search(text)
+    if match is None:
+        return None, text
+
+    count, amount, unit = match.groups()
+    base, factor = UNITS[unit]
+    amount = float(amount.replace(',', '.')) * factor
+    quantity = f"{amount:g}{base}"
+    if count and int(count) > 1:
+        quantity = f"{count}x{quantity}"
+    return quantity, text[:match.start()] + ' ' + text[match.end():]
+
+
+def extract_brand(tokens, brand, known_brands):
+    """
+    Pick the brand of a product: the longest known brand the name starts with,
+    otherwise the stored brand.
+
+    Returns:
+        tuple: (brand, name tokens without the brand tokens)
+    """
+    for size in range(min(BRAND_TOKENS, len(tokens) - 1), 0, -1):
+        prefix = ' '.join(tokens[:size])
+        if prefix in known_brands:
+            return prefix, tokens[size:]
+
+    if brand:
+        brand = ' '.join(TOKEN.findall(casefold(brand)))
+        brand_tokens = set(brand.split())
+        return brand, [token for token in tokens if token not in brand_tokens]
+    return None, tokens
+
+
+def shingles(tokens):
+    """Character 3-grams of every token, independent of word order"""
+    grams = set()
+    for token in tokens:
+        padded = f" {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def jaccard(first, second):
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+class MinHasher:
+    """MinHash signatures with "num_perm" hash functions of the form (a * x + b) mod p"""
+    def __init__(self, num_perm=16, seed=1):
+        generator = random.Random(seed)
+        self.permutations = [
+            (generator.randrange(1, MERSENNE), generator.randrange(0, MERSENNE)) for _ in range(num_perm)
+        ]
+
+    def signature(self, grams):
+        hashes = [zlib.crc32(gram.encode()) for gram in grams]
+        return tuple(min((a * value + b) % MERSENNE for value in hashes) for a, b in self.permutations)
+
+
+def match_products(products, threshold=0.6, num_perm=16, band_size=2, max_bucket=200):
+    """
+    Group equivalent products of different markets.
+
+    Products are blocked by brand and package size, candidates inside a block come
+    from MinHash LSH buckets over name 3-grams, and only candidate pairs with a
+    3-gram Jaccard similarity of at least "threshold" are merged, best pairs first.
+
+    Args:
+        products (iterable of tuple): Each tuple contains (product_id, product_name, brand, market)
+        threshold (float): Minimum Jaccard similarity of a matching pair
+        num_perm (int): MinHash signature length
+        band_size (int): Signature values per LSH band
+        max_bucket (int): LSH buckets larger than this are skipped as too generic
+
+    Returns:
+        list of list: Product ids per group, every group has products of at least two markets
+                      and at most one product per market
+    """
+    products = [
+        (product_id, casefold(product_name), brand, market)
+        for product_id, product_name, brand, market in products
+        if product_name
+    ]
+    known_brands = {
+        ' '.join(TOKEN.findall(casefold(brand))) for product_id, product_name, brand, market in products if brand
+    }
+
+    blocks = defaultdict(list)
+    markets = {}
+    grams = {}
+    for product_id, name, brand, market in products:
+        quantity, name = extract_quantity(name)
+        brand, tokens = extract_brand(TOKEN.findall(name), brand, known_brands)
+        if not tokens:
+            continue
+        blocks[(brand, quantity)].append(product_id)
+        markets[product_id] = market
+        grams[product_id] = shingles(tokens)
+
+    hasher = MinHasher(num_perm)
+    candidates = set()
+    for members in blocks.values():
+        if len({markets[product_id] for product_id in members}) < 2:
+            continue
+
+        if len(members) <= SMALL_BLOCK:
+            candidates.update(combinations(members, 2))
+            continue
+
+        buckets = defaultdict(list)
+        for product_id in members:
+            signature = hasher.signature(grams[product_id])
+            for start in range(0, num_perm, band_size):
+                buckets[(start, signature[start:start + band_size])].append(product_id)
+        for bucket in buckets.values():
+            if 1 < len(bucket) <= max_bucket:
+                candidates.update(combinations(bucket, 2))
+
+    pairs = []
+    for first, second in candidates:
+        if markets[first] == markets[second]:
+            continue
+        score = jaccard(grams[first], grams[second])
+        if score >= threshold:
+            pairs.append((score, first, second))
+    pairs.sort(reverse=True)
+
+    # Union-find keeping the markets of every group, groups sharing a market are never merged
+    parent = {}
+    group_markets = {}
+
+    def find(product_id):
+        root = product_id
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while product_id != root:
+            parent[product_id], product_id = root, parent[product_id]
+        return root
+
+    for score, first, second in pairs:
+        first_root, second_root = find(first), find(second)
+        if first_root == second_root:
+            continue
+        first_markets = group_markets.get(first_root, {markets[first_root]})
+        second_markets = group_markets.get(second_root, {markets[second_root]})
+        if first_markets & second_markets:
+            continue
+        parent.setdefault(first_root, first_root)
+        parent[second_root] = first_root
+        group_markets[first_root] = first_markets | second_markets
+        group_markets.pop(second_root, None)
+
+    groups = defaultdict(list)
+    for product_id in parent:
+        groups[find(product_id)].append(product_id)
+    return [sorted(members) for members in groups.values()]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:30
+
+import django.db.models.deletion
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_products_market_brand_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatestPrice',
+            fields=[
+                ('product', models.OneToOneField(db_column='product_id', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='latest_price', serialize=False, to='products.product')),
+                ('special_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('regular_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('campaign', models.CharField(blank=True, max_length=255, null=True)),
+                ('changed_at', models.DateTimeField(db_default=django.db.models.functions.datetime.Now())),
+                ('last_seen', models.DateTimeField(db_default=django.db.models.functions.datetime.Now())),
+            ],
+            options={
+                'db_table': 'latest_prices',
+            },
+        ),
+    ]
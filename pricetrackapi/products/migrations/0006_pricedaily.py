@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:10
+
+import django.db.models.deletion
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_dataversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceDaily',
+            fields=[
+                ('pk', models.CompositePrimaryKey('product', 'price_day', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('price_day', models.DateField()),
+                ('special_min', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('special_max', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('special_sum', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('special_count', models.IntegerField(default=0)),
+                ('regular_min', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('regular_max', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('regular_sum', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('regular_count', models.IntegerField(default=0)),
+                ('special_last', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('regular_last', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('campaign', models.BooleanField(default=False)),
+                ('last_seen', models.DateTimeField(db_default=django.db.models.functions.datetime.Now())),
+                ('product', models.ForeignKey(db_column='product_id', on_delete=django.db.models.deletion.CASCADE, related_name='daily_prices', to='products.product')),
+            ],
+            options={
+                'db_table': 'price_daily',
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:16
+
+import django.db.models.deletion
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_pricedaily'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductMatch',
+            fields=[
+                ('product', models.OneToOneField(db_column='product_id', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='match', serialize=False, to='products.product')),
+                ('group_id', models.IntegerField()),
+                ('matched_at', models.DateTimeField(db_default=django.db.models.functions.datetime.Now())),
+            ],
+            options={
+                'db_table': 'product_matches',
+                'indexes': [models.Index(fields=['group_id'], name='product_matches_group_idx')],
+            },
+        ),
+    ]
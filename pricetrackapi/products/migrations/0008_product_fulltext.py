@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+def create_fulltext_index(apps, schema_editor):
+    # FULLTEXT with the ngram parser is MySQL only, other backends fall back to LIKE searches
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(
+            "CREATE FULLTEXT INDEX products_name_brand_ft ON products (product_name, brand) WITH PARSER ngram"
+        )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute("DROP INDEX products_name_brand_ft ON products")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_productmatch'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
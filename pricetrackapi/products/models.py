@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Now
 
 class Product(models.Model):
     product_id = models.AutoField(primary_key=True)
@@ -11,6 +12,9 @@ class Product(models.Model):
     class Meta:
         unique_together = ('product_name', 'market')
         db_table = 'products' 
+        indexes = [
+            models.Index(fields=['market', 'brand'], name='products_market_brand_idx'),
+        ]
 
     def __str__(self):
         return f"{self.product_name} ({self.market})"
@@ -31,3 +35,78 @@ class Price(models.Model):
 
     class Meta:
         db_table = 'prices'
+        indexes = [
+            models.Index(fields=['product', 'price_date'], name='prices_product_date_idx'),
+            models.Index(fields=['price_date'], name='prices_date_idx'),
+        ]
+
+
+class LatestPrice(models.Model):
+    product = models.OneToOneField(
+        'Product',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        db_column='product_id',
+        related_name='latest_price'
+    )
+    special_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    regular_price = models.DecimalField(max_digits=10, decimal_places=2)
+    campaign = models.CharField(max_length=255, blank=True, null=True)
+    changed_at = models.DateTimeField(db_default=Now())
+    last_seen = models.DateTimeField(db_default=Now())
+
+    class Meta:
+        db_table = 'latest_prices'
+
+
+class DataVersion(models.Model):
+    market = models.CharField(max_length=40, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(db_default=Now())
+
+    class Meta:
+        db_table = 'data_versions'
+
+
+class PriceDaily(models.Model):
+    pk = models.CompositePrimaryKey('product', 'price_day')
+    product = models.ForeignKey(
+        'Product',
+        on_delete=models.CASCADE,
+        db_column='product_id',
+        related_name='daily_prices'
+    )
+    price_day = models.DateField()
+    special_min = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    special_max = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    special_sum = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    special_count = models.IntegerField(default=0)
+    regular_min = models.DecimalField(max_digits=10, decimal_places=2)
+    regular_max = models.DecimalField(max_digits=10, decimal_places=2)
+    regular_sum = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    regular_count = models.IntegerField(default=0)
+    special_last = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    regular_last = models.DecimalField(max_digits=10, decimal_places=2)
+    campaign = models.BooleanField(default=False)
+    last_seen = models.DateTimeField(db_default=Now())
+
+    class Meta:
+        db_table = 'price_daily'
+
+
+class ProductMatch(models.Model):
+    product = models.OneToOneField(
+        'Product',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        db_column='product_id',
+        related_name='match'
+    )
+    group_id = models.IntegerField()
+    matched_at = models.DateTimeField(db_default=Now())
+
+    class Meta:
+        db_table = 'product_matches'
+        indexes = [
+            models.Index(fields=['group_id'], name='product_matches_group_idx'),
+        ]
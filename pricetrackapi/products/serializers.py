@@ -1,5 +1,7 @@
+from decimal import Decimal
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Product, Price
+from .models import Product, Price, LatestPrice, ProductMatch
 
 class ProductSerializer(serializers.ModelSerializer):
     class Meta:
@@ -24,7 +26,29 @@ class PriceSerializer(serializers.ModelSerializer):
             'campaign'
             ]
 
-class NestedSerializer(serializers.ModelSerializer):
+class PriceBucketSerializer(serializers.Serializer):
+    """Aggregates of one time bucket of a product's price history"""
+    bucket = serializers.DateTimeField()
+    special_min = serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True)
+    special_max = serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True)
+    special_avg = serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True)
+    special_last = serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True)
+    regular_min = serializers.DecimalField(max_digits=10, decimal_places=2)
+    regular_max = serializers.DecimalField(max_digits=10, decimal_places=2)
+    regular_avg = serializers.DecimalField(max_digits=10, decimal_places=2)
+    regular_last = serializers.DecimalField(max_digits=10, decimal_places=2)
+    campaign = serializers.BooleanField()
+
+class DynamicFieldsMixin:
+    """Keeps only the fields listed in the "fields" entry of the serializer context"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+class NestedSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     prices = PriceSerializer(many=True, read_only=True)
 
     class Meta:
@@ -36,4 +60,181 @@ class NestedSerializer(serializers.ModelSerializer):
             'product_image',
             'tags',
             'prices'
-        ]
\ No newline at end of file
+        ]
+
+class LatestPriceSerializer(serializers.ModelSerializer):
+    product_id = serializers.IntegerField(source='product.product_id', read_only=True)
+    product_name = serializers.CharField(source='product.product_name', read_only=True)
+    market = serializers.CharField(source='product.market', read_only=True)
+    brand = serializers.CharField(source='product.brand', read_only=True)
+    product_image = serializers.CharField(source='product.product_image', read_only=True)
+
+    class Meta:
+        model = LatestPrice
+        fields = [
+            'product_id',
+            'product_name',
+            'market',
+            'brand',
+            'product_image',
+            'special_price',
+            'regular_price',
+            'campaign',
+            'changed_at',
+            'last_seen'
+        ]
+
+
+def format_decimal(value):
+    """Same text as DecimalField(decimal_places=2) with COERCE_DECIMAL_TO_STRING"""
+    return f"{Decimal(value).quantize(Decimal('0.01')):f}"
+
+def format_datetime(value):
+    """Same text as DateTimeField with the default ISO 8601 format"""
+    value = timezone.localtime(value).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+class FastSerializer:
+    """
+    Read-only serializer for .values() rows.
+
+    Builds plain dicts in the same JSON format as the matching ModelSerializer
+    without creating field objects for every row.
+    """
+    fields = []
+    sources = {}
+    decimal_fields = ()
+    datetime_fields = ()
+
+    def __init__(self, instance=None, many=False, context=None, **kwargs):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+
+    @classmethod
+    def values_fields(cls):
+        """Arguments for QuerySet.values()"""
+        return [cls.sources.get(name, name) for name in cls.fields]
+
+    def output_fields(self):
+        requested = self.context.get('fields')
+        return [name for name in self.fields if not requested or name in requested]
+
+    def to_representation(self, row, fields):
+        data = {}
+        for name in fields:
+            value = row[self.sources.get(name, name)]
+            if value is not None:
+                if name in self.decimal_fields:
+                    value = format_decimal(value)
+                elif name in self.datetime_fields:
+                    value = format_datetime(value)
+            data[name] = value
+        return data
+
+    @property
+    def data(self):
+        fields = self.output_fields()
+        if self.many:
+            return [self.to_representation(row, fields) for row in self.instance]
+        return self.to_representation(self.instance, fields)
+
+class FastProductSerializer(FastSerializer):
+    fields = ProductSerializer.Meta.fields
+
+class FastPriceSerializer(FastSerializer):
+    fields = PriceSerializer.Meta.fields
+    decimal_fields = ('special_price', 'regular_price')
+    datetime_fields = ('price_date',)
+
+class FastNestedSerializer(FastSerializer):
+    """
+    Products with their prices; prices of the whole page are read with one query
+    from the "prices" queryset of the serializer context.
+    """
+    fields = NestedSerializer.Meta.fields
+
+    @classmethod
+    def values_fields(cls):
+        return [name for name in cls.fields if name != 'prices']
+
+    def to_representation(self, row, fields):
+        data = super().to_representation(row, [name for name in fields if name != 'prices'])
+        if 'prices' in fields:
+            data['prices'] = []
+        return data
+
+    @property
+    def data(self):
+        rows = self.instance if self.many else [self.instance]
+        fields = self.output_fields()
+        products = [self.to_representation(row, fields) for row in rows]
+
+        prices = self.context.get('prices')
+        if 'prices' in fields and prices is not None and rows:
+            by_product = {row['product_id']: product for row, product in zip(rows, products)}
+            price_serializer = FastPriceSerializer()
+            price_fields = price_serializer.output_fields()
+            values = prices.filter(product_id__in=list(by_product)).values('product_id', *FastPriceSerializer.values_fields())
+            for row in values:
+                by_product[row['product_id']]['prices'].append(price_serializer.to_representation(row, price_fields))
+
+        return products if self.many else products[0]
+
+class FastLatestPriceSerializer(FastSerializer):
+    fields = LatestPriceSerializer.Meta.fields
+    sources = {
+        'product_name': 'product__product_name',
+        'market': 'product__market',
+        'brand': 'product__brand',
+        'product_image': 'product__product_image'
+    }
+    decimal_fields = ('special_price', 'regular_price')
+    datetime_fields = ('changed_at', 'last_seen')
+
+class ProductGroupSerializer(FastSerializer):
+    """
+    Matched product groups with the current price of every member; members of the
+    whole page are read with one query.
+    """
+    member_fields = ['market', 'brand', 'product_name', 'product_id', 'product_image', 'special_price', 'regular_price', 'campaign']
+    member_sources = {
+        'market': 'product__market',
+        'brand': 'product__brand',
+        'product_name': 'product__product_name',
+        'product_image': 'product__product_image',
+        'special_price': 'product__latest_price__special_price',
+        'regular_price': 'product__latest_price__regular_price',
+        'campaign': 'product__latest_price__campaign'
+    }
+
+    def member(self, row):
+        data = {}
+        for name in self.member_fields:
+            value = row[self.member_sources.get(name, name)]
+            if value is not None and name in ('special_price', 'regular_price'):
+                value = format_decimal(value)
+            data[name] = value
+        return data
+
+    @property
+    def data(self):
+        rows = self.instance if self.many else [self.instance]
+        groups = {row['group_id']: {'group_id': row['group_id'], 'cheapest': None, 'products': []} for row in rows}
+
+        members = ProductMatch.objects.filter(group_id__in=list(groups)).order_by('group_id', 'product__market')
+        best = {}
+        for row in members.values('group_id', *(self.member_sources.get(name, name) for name in self.member_fields)):
+            group = groups[row['group_id']]
+            member = self.member(row)
+            group['products'].append(member)
+
+            price = row[self.member_sources['special_price']] or row[self.member_sources['regular_price']]
+            if price is not None and (row['group_id'] not in best or price < best[row['group_id']]):
+                best[row['group_id']] = price
+                group['cheapest'] = member['product_id']
+
+        groups = list(groups.values())
+        return groups if self.many else groups[0]
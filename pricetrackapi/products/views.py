@@ -1,6 +1,24 @@
 from rest_framework import generics
-from .models import Product, Price
-from .serializers import ProductSerializer, PriceSerializer, NestedSerializer
+from .models import Product, Price, LatestPrice, PriceDaily, ProductMatch
+from .serializers import (
+    ProductSerializer,
+    PriceSerializer,
+    NestedSerializer,
+    LatestPriceSerializer,
+    FastProductSerializer,
+    FastPriceSerializer,
+    FastNestedSerializer,
+    FastLatestPriceSerializer,
+    PriceBucketSerializer,
+    ProductGroupSerializer
+)
+from .filters import LatestPriceFilter
+from .pagination import OptInCursorPagination
+from .cache import CachedListMixin
+from .serializers import format_decimal, format_datetime
+from django.http import StreamingHttpResponse
+import csv
+import orjson
 from rest_framework.pagination import LimitOffsetPagination
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.views import APIView
@@ -11,6 +29,69 @@ from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.permissions import BasePermission, SAFE_METHODS
+from rest_framework.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Prefetch, Window, F, Min, Max, Avg, Sum, Case, When, Value, BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber, TruncHour, TruncDay, TruncWeek
+from django.conf import settings
+from django.utils.dateparse import parse_datetime, parse_date
+from django.utils import timezone
+from datetime import datetime, time
+import re
+
+
+def parse_moment(value):
+    """Parse a date or datetime query parameter into an aware datetime, None if invalid"""
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                return None
+            moment = datetime.combine(day, time.min)
+    except ValueError:
+        return None
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class FastListMixin:
+    """
+    With API_FAST_SERIALIZATION, list views serialize .values() rows with
+    fast_serializer_class instead of model instances with ModelSerializer.
+    """
+    fast_serializer_class = None
+
+    def fast_enabled(self):
+        return settings.API_FAST_SERIALIZATION and self.fast_serializer_class is not None
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.fast_enabled():
+            return queryset.values(*self.fast_serializer_class.values_fields())
+        return queryset
+
+    def get_serializer_class(self):
+        if self.fast_enabled():
+            return self.fast_serializer_class
+        return super().get_serializer_class()
+
+
+def boolean_query(text, min_size=1):
+    """
+    Turn free text into a MATCH ... AGAINST boolean mode query where every word
+    is required and the last one may be a prefix, e.g. "süt pın" -> "+süt +pın*"
+
+    Words shorter than "min_size" cannot match an ngram index and are dropped,
+    except the last one whose prefix search still works.
+    """
+    words = re.sub(r'[+\-<>()~*"@]', ' ', text).split()
+    if not words:
+        return ''
+    words = [word for word in words[:-1] if len(word) >= min_size] + words[-1:]
+    return ' '.join(f"+{word}" for word in words) + '*'
 
 
 class AdminOrReadOnly(BasePermission):
@@ -46,10 +127,18 @@ class LoginAPIView(APIView):
             'access': str(refresh.access_token),
         })
     
-class WholeAPIView(generics.ListAPIView):
+class WholeAPIView(CachedListMixin, FastListMixin, generics.ListAPIView):
+    """
+    Products with their price history.
+
+    Query parameters bound the prefetched history:
+        prices_since: only prices observed at or after this date/datetime
+        prices_limit: only the last N prices of each product (newest first)
+        fields: comma separated product fields to return, history is skipped without 'prices'
+    """
     permission_classes = [AdminOrReadOnly]
-    queryset = Product.objects.prefetch_related('prices').all()
     serializer_class = NestedSerializer
+    fast_serializer_class = FastNestedSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = [
         'market',
@@ -58,12 +147,77 @@ class WholeAPIView(generics.ListAPIView):
         'product_id',
         'product_image'
         ]
+    pagination_class = LimitOffsetPagination
+
+    def requested_fields(self):
+        fields = self.request.query_params.get('fields')
+        if not fields:
+            return None
+        allowed = NestedSerializer.Meta.fields
+        fields = [field.strip() for field in fields.split(',') if field.strip() in allowed]
+        if not fields:
+            raise ValidationError({'fields': f"Choose from: {', '.join(allowed)}"})
+        return fields
+
+    def prices_since(self):
+        value = self.request.query_params.get('prices_since')
+        if not value:
+            return None
+        since = parse_moment(value)
+        if since is None:
+            raise ValidationError({'prices_since': 'Expected a date or datetime.'})
+        return since
+
+    def prices_limit(self):
+        value = self.request.query_params.get('prices_limit', settings.WHOLE_PRICES_LIMIT)
+        try:
+            limit = int(value)
+        except (TypeError, ValueError):
+            raise ValidationError({'prices_limit': 'Expected an integer.'})
+        if limit < 1 or limit > settings.WHOLE_PRICES_MAX_LIMIT:
+            raise ValidationError({'prices_limit': f'Expected 1 to {settings.WHOLE_PRICES_MAX_LIMIT}.'})
+        return limit
+
+    def price_queryset(self):
+        """Prices of the requested window, None if prices are not requested"""
+        fields = self.requested_fields()
+        if fields and 'prices' not in fields:
+            return None
+
+        prices = Price.objects.order_by('-price_date', '-price_id')
+        since = self.prices_since()
+        if since:
+            prices = prices.filter(price_date__gte=since)
+        return prices.annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=F('product_id'),
+                order_by=[F('price_date').desc(), F('price_id').desc()]
+            )
+        ).filter(row_number__lte=self.prices_limit())
+
+    def get_queryset(self):
+        queryset = Product.objects.order_by('product_id')
+        prices = self.price_queryset()
+        # The fast serializer reads prices of the page itself
+        if prices is None or self.fast_enabled():
+            return queryset
+        return queryset.prefetch_related(Prefetch('prices', queryset=prices))
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.requested_fields()
+        if self.fast_enabled():
+            context['prices'] = self.price_queryset()
+        return context
 
     
-class ProductAPIView(generics.ListAPIView):  
+class ProductAPIView(CachedListMixin, FastListMixin, generics.ListAPIView):  
+    """Products, with keyset pagination by product_id on ?pagination=cursor"""
     permission_classes = [AdminOrReadOnly]
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    fast_serializer_class = FastProductSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = [
         'market',
@@ -72,12 +226,18 @@ class ProductAPIView(generics.ListAPIView):
         'product_id',
         'product_image'
         ]
-    pagination_class = LimitOffsetPagination
+    pagination_class = OptInCursorPagination
+    cursor_ordering = ('product_id',)
 
-class PriceAPIView(generics.ListAPIView): 
+class PriceAPIView(CachedListMixin, FastListMixin, generics.ListAPIView): 
+    """
+    Prices, with keyset pagination on ?pagination=cursor: by price_id, or by
+    (price_date, price_id) when the history of a single product is requested
+    """
     permission_classes = [AdminOrReadOnly]
     queryset = Price.objects.all()
     serializer_class = PriceSerializer
+    fast_serializer_class = FastPriceSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = [
         'product_id',
@@ -87,4 +247,312 @@ class PriceAPIView(generics.ListAPIView):
         'price_date',
         'campaign'
         ]
+    pagination_class = OptInCursorPagination
+
+    @property
+    def cursor_ordering(self):
+        if self.request.query_params.get('product_id'):
+            return ('price_date', 'price_id')
+        return ('price_id',)
+
+class LatestPriceAPIView(CachedListMixin, FastListMixin, generics.ListAPIView):
+    permission_classes = [AdminOrReadOnly]
+    queryset = LatestPrice.objects.select_related('product').order_by('product_id')
+    serializer_class = LatestPriceSerializer
+    fast_serializer_class = FastLatestPriceSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = LatestPriceFilter
+    pagination_class = LimitOffsetPagination
+
+
+class Echo:
+    """File-like object whose write() returns the value, for streaming csv.writer output"""
+    def write(self, value):
+        return value
+
+
+class ExportAPIView(generics.GenericAPIView):
+    """
+    Streams prices joined with their products as NDJSON (default) or CSV (?output=csv).
+
+    Accepts the PriceAPIView filters plus watermarks for incremental pulls:
+        since: only prices observed after this date/datetime
+        since_id: only prices with a greater price_id (the last price_id of the previous pull)
+
+    Rows are read in price_id keyset chunks of EXPORT_CHUNK_SIZE, MySQL drivers buffer
+    whole result sets, so memory stays constant regardless of table size.
+    """
+    permission_classes = [AdminOrReadOnly]
+    queryset = Price.objects.all()
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = PriceAPIView.filterset_fields
+    columns = [
+        ('price_id', 'price_id'),
+        ('product_id', 'product_id'),
+        ('product_name', 'product__product_name'),
+        ('brand', 'product__brand'),
+        ('market', 'product__market'),
+        ('special_price', 'special_price'),
+        ('regular_price', 'regular_price'),
+        ('campaign', 'campaign'),
+        ('price_date', 'price_date')
+    ]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+
+        if params.get('since'):
+            since = parse_moment(params['since'])
+            if since is None:
+                raise ValidationError({'since': 'Expected a date or datetime.'})
+            queryset = queryset.filter(price_date__gt=since)
+
+        if params.get('since_id'):
+            try:
+                queryset = queryset.filter(price_id__gt=int(params['since_id']))
+            except ValueError:
+                raise ValidationError({'since_id': 'Expected an integer.'})
+
+        return queryset
+
+    def rows(self, queryset):
+        """Yields formatted rows, one keyset chunk in memory at a time"""
+        sources = [source for name, source in self.columns]
+        last_id = 0
+        while True:
+            chunk = list(
+                queryset.filter(price_id__gt=last_id)
+                .order_by('price_id')
+                .values_list(*sources)[:settings.EXPORT_CHUNK_SIZE]
+            )
+            if not chunk:
+                return
+            for row in chunk:
+                price_id, product_id, product_name, brand, market, special_price, regular_price, campaign, price_date = row
+                yield (
+                    price_id,
+                    product_id,
+                    product_name,
+                    brand,
+                    market,
+                    format_decimal(special_price) if special_price is not None else None,
+                    format_decimal(regular_price) if regular_price is not None else None,
+                    campaign,
+                    format_datetime(price_date)
+                )
+            last_id = chunk[-1][0]
+
+    def ndjson(self, rows):
+        names = [name for name, source in self.columns]
+        for row in rows:
+            yield orjson.dumps(dict(zip(names, row))) + b"\n"
+
+    def csv(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow([name for name, source in self.columns])
+        for row in rows:
+            yield writer.writerow(row)
+
+    def get(self, request, *args, **kwargs):
+        output = request.query_params.get('output', 'ndjson')
+        if output not in ('ndjson', 'csv'):
+            raise ValidationError({'output': 'Choose from: ndjson, csv'})
+
+        rows = self.rows(self.filter_queryset(self.get_queryset()))
+        if output == 'csv':
+            response = StreamingHttpResponse(self.csv(rows), content_type='text/csv; charset=utf-8')
+        else:
+            response = StreamingHttpResponse(self.ndjson(rows), content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="prices.{output}"'
+        return response
+
+
+class HistoryAPIView(CachedListMixin, generics.ListAPIView):
+    """
+    Price history of one product aggregated into hour, day or week buckets:
+        product_id: required
+        bucket: hour, day (default) or week
+        since, until: date or datetime bounds, both inclusive
+
+    Day and week buckets read the price_daily rollup kept by the storage consumer and
+    average every observation. Hour buckets aggregate the raw prices rows, so they are
+    only offered without PRICE_DEDUP, when prices holds every observation too.
+    """
+    permission_classes = [AdminOrReadOnly]
+    serializer_class = PriceBucketSerializer
+    filter_backends = []
+    pagination_class = None
+    truncations = {'hour': TruncHour, 'day': TruncDay, 'week': TruncWeek}
+
+    def get_queryset(self):
+        params = self.request.query_params
+
+        try:
+            product_id = int(params['product_id'])
+        except (KeyError, ValueError):
+            raise ValidationError({'product_id': 'A product id is required.'})
+
+        bucket = params.get('bucket', 'day')
+        if bucket not in self.truncations:
+            raise ValidationError({'bucket': 'Choose from: hour, day, week'})
+        if bucket == 'hour' and settings.PRICE_DEDUP:
+            raise ValidationError({'bucket': 'Hour buckets are not available while PRICE_DEDUP is enabled.'})
+
+        bounds = {}
+        for name in ('since', 'until'):
+            if params.get(name):
+                bounds[name] = parse_moment(params[name])
+                if bounds[name] is None:
+                    raise ValidationError({name: 'Expected a date or datetime.'})
+
+        if bucket == 'hour':
+            return self.price_buckets(product_id, bounds)
+        return self.rollup_buckets(product_id, self.truncations[bucket], bounds)
+
+    def price_buckets(self, product_id, bounds):
+        """Returns hourly aggregates of the raw prices rows"""
+        prices = Price.objects.filter(product_id=product_id)
+        if 'since' in bounds:
+            prices = prices.filter(price_date__gte=bounds['since'])
+        if 'until' in bounds:
+            prices = prices.filter(price_date__lte=bounds['until'])
+
+        rows = list(
+            prices.annotate(bucket=TruncHour('price_date'))
+            .values('bucket')
+            .annotate(
+                special_min=Min('special_price'),
+                special_max=Max('special_price'),
+                special_avg=Avg('special_price'),
+                regular_min=Min('regular_price'),
+                regular_max=Max('regular_price'),
+                regular_avg=Avg('regular_price'),
+                campaign=Max(Case(When(campaign__isnull=False, then=Value(1)), default=Value(0))),
+                last_id=Max('price_id')
+            )
+            .order_by('bucket')
+        )
+
+        last = {
+            price_id: (special_price, regular_price)
+            for price_id, special_price, regular_price in Price.objects.filter(
+                price_id__in=[row['last_id'] for row in rows]
+            ).values_list('price_id', 'special_price', 'regular_price')
+        }
+        for row in rows:
+            row['special_last'], row['regular_last'] = last[row.pop('last_id')]
+            row['campaign'] = bool(row['campaign'])
+        return rows
+
+    def rollup_buckets(self, product_id, truncation, bounds):
+        """Returns daily or weekly aggregates of the price_daily rollup"""
+        days = PriceDaily.objects.filter(product_id=product_id)
+        if 'since' in bounds:
+            days = days.filter(price_day__gte=timezone.localdate(bounds['since']))
+        if 'until' in bounds:
+            days = days.filter(price_day__lte=timezone.localdate(bounds['until']))
+
+        rows = list(
+            days.annotate(bucket=truncation('price_day'))
+            .values('bucket')
+            .annotate(
+                special_min=Min('special_min'),
+                special_max=Max('special_max'),
+                special_sum=Sum('special_sum'),
+                special_count=Sum('special_count'),
+                regular_min=Min('regular_min'),
+                regular_max=Max('regular_max'),
+                regular_sum=Sum('regular_sum'),
+                regular_count=Sum('regular_count'),
+                campaign=Max('campaign'),
+                last_day=Max('price_day')
+            )
+            .order_by('bucket')
+        )
+
+        last = {
+            price_day: (special_last, regular_last)
+            for price_day, special_last, regular_last in days.filter(
+                price_day__in=[row['last_day'] for row in rows]
+            ).values_list('price_day', 'special_last', 'regular_last')
+        }
+        for row in rows:
+            row['special_last'], row['regular_last'] = last[row.pop('last_day')]
+            special_sum, special_count = row.pop('special_sum'), row.pop('special_count')
+            regular_sum, regular_count = row.pop('regular_sum'), row.pop('regular_count')
+            row['special_avg'] = special_sum / special_count if special_count else None
+            row['regular_avg'] = regular_sum / regular_count
+            row['bucket'] = timezone.make_aware(datetime.combine(row['bucket'], time.min))
+            row['campaign'] = bool(row['campaign'])
+        return rows
+
+
+class CompareAPIView(CachedListMixin, generics.ListAPIView):
+    """
+    Groups of the same product in different markets, as built by the match_products command:
+        product_id: only the group of this product
+        brand, market: only groups with a member of this brand or market
+
+    Every group lists its members with their current prices and the product id of the cheapest one.
+    """
+    permission_classes = [AdminOrReadOnly]
+    serializer_class = ProductGroupSerializer
+    filter_backends = []
     pagination_class = LimitOffsetPagination
+    # Groups filtered by one market still show prices of the others
+    market_versioned = False
+
+    def get_queryset(self):
+        params = self.request.query_params
+        matches = ProductMatch.objects.all()
+
+        if params.get('product_id'):
+            try:
+                product_id = int(params['product_id'])
+            except ValueError:
+                raise ValidationError({'product_id': 'Expected an integer.'})
+            matches = matches.filter(group_id__in=ProductMatch.objects.filter(product_id=product_id).values('group_id'))
+        if params.get('brand'):
+            matches = matches.filter(product__brand=params['brand'])
+        if params.get('market'):
+            matches = matches.filter(product__market=params['market'])
+
+        return matches.values('group_id').distinct().order_by('group_id')
+
+
+class SearchAPIView(CachedListMixin, FastListMixin, generics.ListAPIView):
+    """
+    Product search ranked by relevance: ?q=<text>&market=<market>
+
+    Uses the ngram FULLTEXT index on product_name and brand. Queries without a word
+    of SEARCH_NGRAM_SIZE characters fall back to a product_name prefix match.
+    """
+    permission_classes = [AdminOrReadOnly]
+    queryset = Product.objects.all()
+    serializer_class = ProductSerializer
+    fast_serializer_class = FastProductSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['market']
+    pagination_class = LimitOffsetPagination
+
+    def get_queryset(self):
+        text = self.request.query_params.get('q', '').strip()
+        if not text:
+            raise ValidationError({'q': 'A search text is required.'})
+
+        queryset = super().get_queryset()
+        query = boolean_query(text, settings.SEARCH_NGRAM_SIZE)
+        if (
+            connection.vendor != 'mysql'
+            or not query
+            or max(len(word) for word in text.split()) < settings.SEARCH_NGRAM_SIZE
+        ):
+            return queryset.filter(product_name__istartswith=text).order_by('product_name', 'product_id')
+
+        match = "MATCH (product_name, brand) AGAINST (%s IN BOOLEAN MODE)"
+        return (
+            queryset.filter(RawSQL(match, (query,), output_field=BooleanField()))
+            .annotate(score=RawSQL(match, (query,), output_field=FloatField()))
+            .order_by('-score', 'product_id')
+        )
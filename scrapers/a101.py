@@ -1,21 +1,22 @@
 import os
-import requests
 from dotenv import load_dotenv
 from utils import fakeua
 from utils.logger import logger
-from messaging.publisher import RabbitPublisher
+from utils.http import HttpClient
+from messaging.publisher import create_publisher
 
 load_dotenv()
 
 class A101Scraper:   
-    def __init__(self):
+    def __init__(self, publisher=None):
         self.market = "a101"
         self.total_page = 0
-        self.publisher = RabbitPublisher()
+        self.publisher = publisher if publisher is not None else create_publisher()
         self.api_url = os.getenv('A101_API_URL')
         self.headers = {
             "User-Agent": fakeua.set_uagent()
         }
+        self.http = HttpClient(headers=self.headers, rate=float(os.getenv("A101_RPS", 0)))
 
     def pagination(self):
         """
@@ -27,7 +28,7 @@ class A101Scraper:
         while True:
             category_id = f"{category_num:02d}"
             url = self.api_url.replace("id=C01", f"id=C{category_id}")
-            resp = requests.get(url, headers=self.headers)
+            resp = self.http.get(url)
 
             if resp.status_code == 404:
                 logger.info(f"No more data available on page {category_id}")
@@ -1,89 +1,251 @@
 import os
-from urllib.parse import urljoin
+import json
+import queue
+import asyncio
+import threading
+from urllib.parse import urljoin, urlparse
 from bs4 import BeautifulSoup
 from utils.logger import logger
 from utils.fakeua import set_uagent as ua
-from messaging.publisher import RabbitPublisher
+from utils.ratelimit import AsyncRateLimiter
+from messaging.publisher import create_publisher
 from dotenv import load_dotenv
-import time
-import random
-from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
 
 load_dotenv()
 
+CATEGORY_SELECTOR = 'a[href*="/buyuk/kategori/"]'
+PRODUCT_SELECTOR = 'a[href*="/buyuk/urun/"]'
+
+# Only the DOM is parsed, so none of these are needed to scrape a page
+BLOCKED_RESOURCES = {"image", "media", "font", "stylesheet"}
+BLOCKED_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "facebook.net",
+    "facebook.com",
+    "hotjar.com",
+    "clarity.ms",
+    "segment.io",
+    "criteo.com",
+    "criteo.net",
+    "adjust.com",
+    "appsflyer.com",
+    "useinsider.com",
+    "nr-data.net"
+)
+
+IMAGE_KEYS = ("picURL", "imageURL", "image", "picURLs", "images")
+
+
+# Getir lists a category's products under this key, every product carries an id
+PRODUCT_LIST_KEY = "products"
+PRODUCT_ID_KEYS = ("id", "_id")
+
+
+def json_price(value):
+    """Convert a JSON price (number, "30.50" or "₺1.234,50" text) to float"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str) and value.strip():
+        text = value.strip()
+        try:
+            # Only display texts use the Turkish format: "." groups thousands, "," marks decimals
+            if '₺' in text or ',' in text:
+                return float(text.replace('₺', '').replace('.', '').replace(',', '.').strip())
+            return float(text)
+        except ValueError:
+            return None
+    return None
+
+
+def is_product(node):
+    """A Getir product object: an id, a "name" text and a "price" """
+    return (
+        isinstance(node, dict)
+        and any(node.get(key) not in (None, "") for key in PRODUCT_ID_KEYS)
+        and isinstance(node.get("name"), str)
+        and json_price(node.get("price")) is not None
+    )
+
+
+def iter_json_products(payloads):
+    """
+    Walks captured JSON payloads
+
+    Yields the product objects of every "products" list, so fees, banners and
+    recommendations elsewhere in the payload are not taken for category products
+    """
+    stack = list(reversed(payloads))
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            products = node.get(PRODUCT_LIST_KEY)
+            if isinstance(products, list):
+                yield from (item for item in products if is_product(item))
+            stack.extend(reversed([value for key, value in node.items() if key != PRODUCT_LIST_KEY]))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+
+
 class GetirScraper:
-    def __init__(self):
-        self.publisher = RabbitPublisher()
+    def __init__(self, publisher=None):
+        self.publisher = publisher if publisher is not None else create_publisher()
         self.url = os.getenv('GETIR_URL')
         self.market = "getir"
+        self.pool_size = int(os.getenv('GETIR_POOL_SIZE', 4))
+        self.rate_limiter = AsyncRateLimiter(float(os.getenv('GETIR_RPS', 1)))
+        self.block_resources = os.getenv('GETIR_BLOCK_RESOURCES', 'true').lower() == 'true'
+        self.capture_json = os.getenv('GETIR_CAPTURE_JSON', 'true').lower() == 'true'
+        self.json_quiet_ms = int(os.getenv('GETIR_JSON_QUIET_MS', 1000))
+        self.json_max_wait_ms = int(os.getenv('GETIR_JSON_MAX_WAIT_MS', 10000))
+        self.chunk_items = int(os.getenv('GETIR_CHUNK_ITEMS', 500))
+        self.chunk_bytes = int(os.getenv('GETIR_CHUNK_BYTES', 1000000))
+        self.queue_size = int(os.getenv('GETIR_QUEUE_SIZE', 8))
+        self.stop = threading.Event()
+        self.total_product = 0
         self.playwright = None
         self.browser = None 
         self.context = None
-        self.page = None
         
-    def setup_playwright(self):
+    async def setup_playwright(self):
         """Start playwright browser"""
-        self.playwright = sync_playwright().start()
-        self.browser = self.playwright.chromium.launch(
+        self.playwright = await async_playwright().start()
+        self.browser = await self.playwright.chromium.launch(
             headless=True,
         )
-        self.context = self.browser.new_context(
+        self.context = await self.browser.new_context(
             user_agent=ua()
         )
+        if self.block_resources:
+            await self.context.route("**/*", self.block_request)
         return True
 
-    def close_playwright(self):
+    async def block_request(self, route):
+        """Abort assets and analytics requests, let everything else through"""
+        request = route.request
+        host = urlparse(request.url).hostname or ""
+        blocked_host = any(host == blocked or host.endswith("." + blocked) for blocked in BLOCKED_HOSTS)
+
+        if request.resource_type in BLOCKED_RESOURCES or blocked_host:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def close_playwright(self):
         """Close playwright browser"""
         try:
-            if self.page and not self.page.is_closed():
-                self.page.close()
             if self.context:
-                self.context.close()
+                await self.context.close()
             if self.browser:
-                self.browser.close()
+                await self.browser.close()
             if self.playwright:
-                self.playwright.stop()
+                await self.playwright.stop()
         except Exception as e:
             logger.error(f"Error closing playwright: {e}")
     
-    def fetch_html(self, url=None):
-        """Fetch and return JavaScript-rendered HTML content from given URL"""
+    async def load_page(self, page, url=None, selector=CATEGORY_SELECTOR):
+        """
+        Navigate given page to given URL
+
+        Page is considered ready as soon as the given selector is attached
+        """
         if url is None:
             url = self.url
-            
-        if not self.playwright:
-            if not self.setup_playwright():
-                return None
-                
-        self.page = self.context.new_page()
+
+        await self.rate_limiter.wait()
         
         logger.info(f"Navigating to: {url}")
-        self.page.goto(url, wait_until="domcontentloaded", timeout=60000)
-        
-        self.page.wait_for_load_state('networkidle', timeout=60000)
+        await page.goto(url, wait_until="domcontentloaded", timeout=60000)
         
         try:
-            logger.info("Waiting for category links...")
-            self.page.wait_for_selector('a[href*="/buyuk/kategori/"]', timeout=30000)
+            await page.wait_for_selector(selector, state="attached", timeout=30000)
         except:
-            logger.info("Waiting for product links...")
-            self.page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-            self.page.wait_for_selector('a[href*="/buyuk/urun/"]', timeout=30000)
-        
-        html = self.page.content()
-        self.page.close()
-        return html
+            logger.info(f"Waiting for {selector} after scrolling...")
+            await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+            await page.wait_for_selector(selector, state="attached", timeout=30000)
+
+    async def fetch_html(self, page, url=None, selector=CATEGORY_SELECTOR):
+        """Fetch and return JavaScript-rendered HTML content from given URL with given page"""
+        await self.load_page(page, url, selector)
+        return await page.content()
+
+    async def fetch_json(self, page, url, selector=PRODUCT_SELECTOR):
+        """
+        Navigate given page to given URL while capturing its JSON XHR/fetch responses
+
+        After the selector is attached the page is scrolled to the bottom, and capturing
+        goes on until no XHR/fetch request ran for "self.json_quiet_ms" milliseconds,
+        at most "self.json_max_wait_ms", so late and lazily loaded products are kept
+
+        Returns a list of decoded JSON payloads, including the embedded __NEXT_DATA__
+        """
+        loop = asyncio.get_running_loop()
+        pending = []
+        inflight = set()
+        activity = {"last": loop.time()}
+
+        def on_request(request):
+            if request.resource_type in ("xhr", "fetch"):
+                inflight.add(request)
+                activity["last"] = loop.time()
+
+        def on_request_done(request):
+            if request in inflight:
+                inflight.discard(request)
+                activity["last"] = loop.time()
 
-    def get_categories(self):
+        def on_response(response):
+            content_type = response.headers.get("content-type", "")
+            if response.request.resource_type in ("xhr", "fetch") and "json" in content_type:
+                pending.append(asyncio.ensure_future(response.json()))
+
+        listeners = (
+            ("request", on_request),
+            ("requestfinished", on_request_done),
+            ("requestfailed", on_request_done),
+            ("response", on_response)
+        )
+        for event, listener in listeners:
+            page.on(event, listener)
+        try:
+            await self.load_page(page, url, selector)
+            await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+
+            deadline = loop.time() + self.json_max_wait_ms / 1000
+            while loop.time() < deadline:
+                if not inflight and loop.time() - activity["last"] >= self.json_quiet_ms / 1000:
+                    break
+                await asyncio.sleep(0.1)
+            if inflight:
+                logger.info(f"{len(inflight)} requests still running after {self.json_max_wait_ms}ms")
+        finally:
+            for event, listener in listeners:
+                page.remove_listener(event, listener)
+
+        payloads = []
+        for result in await asyncio.gather(*pending, return_exceptions=True):
+            if not isinstance(result, Exception):
+                payloads.append(result)
+
+        next_data = await page.evaluate("() => window.__NEXT_DATA__ || null")
+        if next_data:
+            payloads.append(next_data)
+        return payloads
+
+    async def get_categories(self, page):
         """
         Scrapes all category URLs from Getir's home page
         
         Returns a list of category URLs
         """
-        html = self.fetch_html()
+        html = await self.fetch_html(page)
         soup = BeautifulSoup(html, "html.parser")
         
-        category_urls = soup.select('a[href*="/buyuk/kategori/"]')
+        category_urls = soup.select(CATEGORY_SELECTOR)
 
         cats = []
         for category_link in category_urls:
@@ -94,108 +256,302 @@ class GetirScraper:
         logger.info(f'Number of categories found: {len(cats)}')
         return cats
 
-    def scrape(self):
+    def category_tags(self, category_url):
+        """Returns category name taken from the category URL as a tag list"""
+        if '/' in category_url:
+            category_name = category_url.split('/')[-2].split('-')[:-1]
+            category_name = ' '.join(category_name)
+            return [category_name] if category_name.strip() else []
+        return []
+
+    def parse_json_products(self, payloads, category_url):
         """
-        Scrapes each paginated categories and makes it ready for RabbitMQ
+        Builds product and price lists of a single category from captured JSON
 
-        Yields 2 tuples as products and prices
+        Prices follow parse_products: a struck price becomes regular_price with a
+        "Discount" campaign, a single price is stored as special_price
         """
-        try:
-            categories = self.get_categories()
-            
-            product_data = [] 
-            price_data = []    
-            for category_url in categories:
-                logger.info(f"Category is processing: {category_url}")
+        product_data = []
+        price_data = []
+        tags = self.category_tags(category_url)
+
+        seen = set()
+        for item in iter_json_products(payloads):
+            try:
+                product_name = item["name"].strip()
+                if not product_name or product_name in seen:
+                    continue
+                seen.add(product_name)
+
+                price = json_price(item.get("price"))
+                struck_price = json_price(item.get("struckPrice"))
+
+                regular_price = None
+                special_price = price
+                campaign = None
+                if struck_price and struck_price != price:
+                    regular_price = struck_price
+                    campaign = "Discount"
+
+                product_image = None
+                for key in IMAGE_KEYS:
+                    image = item.get(key)
+                    if isinstance(image, list):
+                        image = image[0] if image else None
+                    if isinstance(image, str) and image:
+                        product_image = image
+                        break
+
+                brand = item.get("brand")
+                if isinstance(brand, dict):
+                    brand = brand.get("name")
+                if not isinstance(brand, str) or not brand:
+                    brand = product_name.split(' ')[0] if ' ' in product_name else None
+
+                product_data.append({
+                    "product_name": product_name,
+                    "brand": brand,
+                    "market": self.market,
+                    "product_image": product_image,
+                    "tags": tags
+                })
+                price_data.append({
+                    "product_name": product_name,
+                    "market": self.market,
+                    "special_price": special_price,
+                    "regular_price": regular_price,
+                    "campaign": campaign
+                })
+            except Exception as e:
+                logger.error(f"Product processing error: {e}")
+                continue
+
+        logger.info(f"{len(product_data)} > Products found in captured JSON")
+        return product_data, price_data
+
+    def parse_products(self, html, category_url):
+        """
+        Parses rendered category HTML
+
+        Returns product and price lists of a single category
+        """
+        product_data = []
+        price_data = []
+
+        soup = BeautifulSoup(html, "html.parser")
+        products = soup.select(PRODUCT_SELECTOR)
+        
+        logger.info(f"{len(products)} > Products found in this category")
+        
+        for product in products:
+            try:
+                figure = product.find('figure')
+                product_name = figure.get('title')
                 
-                try:
-                    html = self.fetch_html(category_url)
-                    soup = BeautifulSoup(html, "html.parser")
-                    products = soup.select('a[href*="/buyuk/urun/"]')
-                    
-                    logger.info(f"{len(products)} > Products found in this category")
+                img = product.select_one('img[data-testid="main-image"]')
+                product_image = img.get('src') if img else None
+                
+                container = product.find_parent("article")
+                regular_price = None
+                special_price = None
+                campaign = None
+                
+                if container:
+                    price_spans = container.select('span[data-testid="text"]')
+                    prices = [span.text for span in price_spans if '₺' in span.text]
                     
-                    for product in products:
+                    if len(prices) >= 2:
+                        regular_price = prices[0].replace('₺', '')
+                        regular_price = float(regular_price.replace('.', '').replace(',', '.').strip())
                         try:
-                            figure = product.find('figure')
-                            product_name = figure.get('title')
-                            
-                            img = product.select_one('img[data-testid="main-image"]')
-                            product_image = img.get('src') if img else None
-                            
-                            container = product.find_parent("article")
-                            regular_price = None
+                            special_price = prices[1].replace('₺', '')
+                            special_price = float(special_price.replace('.', '').replace(',', '.').strip())
+                        except ValueError:
                             special_price = None
-                            campaign = None
-                            
-                            if container:
-                                price_spans = container.select('span[data-testid="text"]')
-                                prices = [span.text for span in price_spans if '₺' in span.text]
-                                
-                                if len(prices) >= 2:
-                                    regular_price = prices[0].replace('₺', '')
-                                    regular_price = float(regular_price.replace('.', '').replace(',', '.').strip())
-                                    try:
-                                        special_price = prices[1].replace('₺', '')
-                                        special_price = float(special_price.replace('.', '').replace(',', '.').strip())
-                                    except ValueError:
-                                        special_price = None
-                                        
-                                    campaign = "Discount"  
-                                elif len(prices) == 1:
-                                        special_price = prices[0].replace('₺', '')
-                                        special_price = float(special_price.replace('.', '').replace(',', '.').strip())
                             
-                            brand = None
-                            if product_name and ' ' in product_name:
-                                brand = product_name.split(' ')[0]
-                            
-                            if '/' in category_url:
-                                category_name = category_url.split('/')[-2].split('-')[:-1]
-                                category_name = ' '.join(category_name)
-                                tags = [category_name] if category_name.strip() else []
-                            else:
-                                tags = []
-                            
-                            products_dict = {
-                                "product_name": product_name.strip(),
-                                "brand": brand,
-                                "market": self.market,
-                                "product_image": product_image,
-                                "tags": tags
-                            }
-
-                            prices_dict = {
-                                "product_name": product_name.strip(),
-                                "market": self.market,
-                                "special_price": special_price,
-                                "regular_price": regular_price,
-                                "campaign": campaign
-                            }
-
-                            product_data.append(products_dict)
-                            price_data.append(prices_dict)
-                            
-                        except Exception as e:
-                            logger.error(f"Product processing error: {e}")
-                            continue
-                    
-                    wait_time = random.uniform(1, 3)
-                    logger.info(f"Waiting {wait_time} seconds...")
-                    time.sleep(wait_time)
-                    
+                        campaign = "Discount"  
+                    elif len(prices) == 1:
+                            special_price = prices[0].replace('₺', '')
+                            special_price = float(special_price.replace('.', '').replace(',', '.').strip())
+                
+                brand = None
+                if product_name and ' ' in product_name:
+                    brand = product_name.split(' ')[0]
+                
+                tags = self.category_tags(category_url)
+                
+                products_dict = {
+                    "product_name": product_name.strip(),
+                    "brand": brand,
+                    "market": self.market,
+                    "product_image": product_image,
+                    "tags": tags
+                }
+
+                prices_dict = {
+                    "product_name": product_name.strip(),
+                    "market": self.market,
+                    "special_price": special_price,
+                    "regular_price": regular_price,
+                    "campaign": campaign
+                }
+
+                product_data.append(products_dict)
+                price_data.append(prices_dict)
+                
+            except Exception as e:
+                logger.error(f"Product processing error: {e}")
+                continue
+
+        return product_data, price_data
+
+    async def fetch_category(self, page, category_url):
+        """
+        Renders a category and builds its products from captured JSON
+
+        Falls back to parsing the rendered HTML when JSON capture is disabled
+        or captured responses hold fewer products than the page links to
+        """
+        if not self.capture_json:
+            html = await self.fetch_html(page, category_url, PRODUCT_SELECTOR)
+            return self.parse_products(html, category_url)
+
+        payloads = await self.fetch_json(page, category_url)
+        category = self.parse_json_products(payloads, category_url)
+        linked = await page.eval_on_selector_all(
+            PRODUCT_SELECTOR, "links => new Set(links.map(link => link.getAttribute('href'))).size"
+        )
+        if len(category[0]) < linked:
+            logger.info(f"Captured JSON holds {len(category[0])} of {linked} products, parsing HTML instead")
+            html_category = self.parse_products(await page.content(), category_url)
+            if len(html_category[0]) > len(category[0]):
+                category = html_category
+        return category
+
+    async def hand_over(self, results, item):
+        """
+        Puts an item into the thread-safe results queue without blocking the event loop,
+        so open pages and their route callbacks keep running while the queue is full
+
+        Returns False when scraping was stopped before the item could be queued
+        """
+        while not self.stop.is_set():
+            try:
+                results.put_nowait(item)
+                return True
+            except queue.Full:
+                await asyncio.sleep(0.1)
+        return False
+
+    async def worker(self, categories, results):
+        """
+        Renders categories from the queue with its own page until the queue is empty
+
+        Puts (product_data, price_data) of each category to results queue
+        """
+        page = await self.context.new_page()
+        try:
+            while not self.stop.is_set():
+                try:
+                    category_url = categories.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+
+                logger.info(f"Category is processing: {category_url}")
+                try:
+                    if not await self.hand_over(results, await self.fetch_category(page, category_url)):
+                        return
                 except Exception as e:
                     logger.exception(f"Category processing error {category_url}: {e}")
-                    continue
-            
-            logger.info(f"A total of {len(product_data)} products were found")
-            logger.info(f"A total of {len(price_data)} prices were found")
-            
-            yield (self.market, "product", product_data)
-            yield (self.market, "price", price_data)
-            
         finally:
-            self.close_playwright()
+            await page.close()
+
+    async def crawl(self, results):
+        """
+        Renders all categories with "self.pool_size" pages sharing one browser
+
+        Puts None to results queue when crawl is finished
+        """
+        try:
+            await self.setup_playwright()
+
+            page = await self.context.new_page()
+            try:
+                categories = asyncio.Queue()
+                for category_url in await self.get_categories(page):
+                    categories.put_nowait(category_url)
+            finally:
+                await page.close()
+
+            workers = [self.worker(categories, results) for _ in range(self.pool_size)]
+            await asyncio.gather(*workers)
+        finally:
+            await self.close_playwright()
+            await self.hand_over(results, None)
+
+    def chunks(self, product_data, price_data):
+        """
+        Splits a category into pieces of at most "self.chunk_items" items and
+        roughly "self.chunk_bytes" JSON bytes per message
+
+        Yields (product_chunk, price_chunk) pairs that hold the same products
+        """
+        start = 0
+        size = 0
+        for index, (product, price) in enumerate(zip(product_data, price_data)):
+            item_size = max(
+                len(json.dumps(product, ensure_ascii=False).encode()),
+                len(json.dumps(price, ensure_ascii=False).encode())
+            )
+            if index > start and (index - start >= self.chunk_items or size + item_size > self.chunk_bytes):
+                yield product_data[start:index], price_data[start:index]
+                start = index
+                size = 0
+            size += item_size
+
+        if start < len(product_data):
+            yield product_data[start:], price_data[start:]
+
+    def scrape(self):
+        """
+        Scrapes categories and makes them ready for RabbitMQ as soon as each one is finished
+
+        crawl() runs on its own event loop thread, so pages keep loading while the
+        caller publishes, and hands categories over through a bounded queue
+
+        Yields 2 tuples as products and prices for every chunk of a category
+        """
+        self.stop.clear()
+        results = queue.Queue(maxsize=self.queue_size)
+        loop = asyncio.new_event_loop()
+        crawl = loop.create_task(self.crawl(results))
+        thread = threading.Thread(
+            target=loop.run_until_complete, args=(asyncio.wait([crawl]),), name="getir-crawl", daemon=True
+        )
+        thread.start()
+        try:
+            while True:
+                category = results.get()
+                if category is None:
+                    break
+
+                product_data, price_data = category
+                self.total_product += len(product_data)
+                for product_chunk, price_chunk in self.chunks(product_data, price_data):
+                    yield (self.market, "product", product_chunk)
+                    yield (self.market, "price", price_chunk)
+            thread.join()
+            # Raises the crawl's error, if any
+            crawl.result()
+
+            logger.info(f"A total of {self.total_product} products were found")
+
+        finally:
+            if thread.is_alive():
+                self.stop.set()
+                loop.call_soon_threadsafe(crawl.cancel)
+                thread.join()
+            loop.close()
 
 
 if __name__ == "__main__":
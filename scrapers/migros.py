@@ -1,22 +1,30 @@
 import os
 import requests
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from dotenv import load_dotenv
 from utils import fakeua
 from utils.logger import logger
-from messaging.publisher import RabbitPublisher
+from utils.http import HttpClient
+from messaging.publisher import create_publisher
 
 load_dotenv()
 
 class MigrosScraper:   
-    def __init__(self):
+    def __init__(self, publisher=None):
         self.market = "migros"
         self.total_page = 0
-        self.publisher = RabbitPublisher()
+        self.publisher = publisher if publisher is not None else create_publisher()
         self.categories_url = os.getenv("MIGROS_CATEGORIES_URL")
         self.api_url = os.getenv("MIGROS_API_URL")
+        self.concurrency = int(os.getenv("MIGROS_CONCURRENCY", 8))
         self.headers = {
             "User-Agent": fakeua.set_uagent()
         }
+        self.http = HttpClient(
+            headers=self.headers,
+            pool_size=self.concurrency,
+            rate=float(os.getenv("MIGROS_RPS", 0))
+        )
 
     def get_categories(self):
         """
@@ -24,7 +32,7 @@ class MigrosScraper:
 
         Returns List of category URLs
         """
-        response = requests.get(self.categories_url, headers=self.headers)
+        response = self.http.get(self.categories_url)
         content = response.json()
         data = content['data']
         categories = []
@@ -34,37 +42,64 @@ class MigrosScraper:
             categories.append(self.api_url + pretty_name)
         return categories
 
+    def fetch_page(self, link, page_num):
+        """
+        Requests a single page of a category
+
+        Returns (link, page_num, data) where data is None if request is unsuccesful
+        """
+        page_url = f"{link}?sayfa={page_num}"
+        try:
+            category_response = self.http.get(page_url)
+        except requests.RequestException as e:
+            logger.error(f"Error: {page_url} failed because of: {e}")
+            return link, page_num, None
+
+        if category_response.status_code != 200:
+            logger.error(f"Error: Status code {category_response.status_code}")
+            return link, page_num, None
+
+        logger.info(f"fetched: {page_url}")
+        return link, page_num, category_response.json()['data']
+
     def link_generator(self):
         """
-        Adds categories to the API URL and increases the number of pages
+        Fetches category pages concurrently with at most "self.concurrency" requests in flight
 
-        If request is unsuccesful "while loop" breaking with "status_code != 200"
-        If page_count or hit_count is 0 than while loop is breaks
+        First page of every category is requested at once, its page_count is used
+        to request the remaining pages of that category at once.
+        If page_count or hit_count is 0 than category is skipped
 
-        Yields JSON response data for a single page
+        Yields JSON response data for a single page in completion order
         """
-        for link in self.get_categories():
-            page_num = 1
-            while True:
-                page_url = f"{link}?sayfa={page_num}"
-                category_response = requests.get(page_url, headers=self.headers)
-
-                if category_response.status_code != 200:
-                    logger.error(f"Error: Status code {category_response.status_code}")
-                    break
-
-                data = category_response.json()['data']
-                page_count = data['searchInfo']['pageCount']
-                hit_count = data['searchInfo']['hitCount']
-
-                if page_count == 0 or hit_count == 0:
-                    logger.info(f"No more data available on page {page_num}")
-                    break
-
-                logger.info(f"fetched: {page_url}")
-                self.total_page += 1
-                yield data
-                page_num += 1
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            pending = set()
+            for link in self.get_categories():
+                pending.add(executor.submit(self.fetch_page, link, 1))
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    link, page_num, data = future.result()
+                    if data is None:
+                        continue
+
+                    page_count = data['searchInfo']['pageCount']
+                    hit_count = data['searchInfo']['hitCount']
+
+                    if page_count == 0 or hit_count == 0:
+                        logger.info(f"No more data available on page {page_num}")
+                        continue
+
+                    if page_num == 1:
+                        for next_page in range(2, page_count + 1):
+                            pending.add(executor.submit(self.fetch_page, link, next_page))
+
+                    self.total_page += 1
+                    yield data
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
 
     def scrape(self):
         """
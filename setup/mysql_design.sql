@@ -1,6 +1,10 @@
 USE pricetrack;
 ALTER DATABASE pricetrack CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
 
+DROP TABLE IF EXISTS data_versions;
+DROP TABLE IF EXISTS price_daily;
+DROP TABLE IF EXISTS product_matches;
+DROP TABLE IF EXISTS latest_prices;
 DROP TABLE IF EXISTS prices;
 DROP TABLE IF EXISTS products;
 
@@ -11,7 +15,9 @@ CREATE TABLE products (
     market VARCHAR(40) NOT NULL,
     product_image VARCHAR(255),
     tags JSON,
-    UNIQUE (product_name, market)
+    UNIQUE (product_name, market),
+    INDEX products_market_brand_idx (market, brand),
+    FULLTEXT INDEX products_name_brand_ft (product_name, brand) WITH PARSER ngram
 )
 DEFAULT CHARSET=utf8mb4
 COLLATE=utf8mb4_unicode_ci;
@@ -23,8 +29,60 @@ CREATE TABLE prices (
     regular_price DECIMAL(10,2) NOT NULL,
     price_date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
     campaign VARCHAR(255),
+    INDEX prices_product_date_idx (product_id, price_date),
+    INDEX prices_date_idx (price_date),
     FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
 )
 DEFAULT CHARSET=utf8mb4
 COLLATE=utf8mb4_unicode_ci;
 
+CREATE TABLE latest_prices (
+    product_id INT PRIMARY KEY,
+    special_price DECIMAL(10,2),
+    regular_price DECIMAL(10,2) NOT NULL,
+    campaign VARCHAR(255),
+    changed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_seen DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
+)
+DEFAULT CHARSET=utf8mb4
+COLLATE=utf8mb4_unicode_ci;
+
+CREATE TABLE data_versions (
+    market VARCHAR(40) PRIMARY KEY,
+    version BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+DEFAULT CHARSET=utf8mb4
+COLLATE=utf8mb4_unicode_ci;
+
+CREATE TABLE price_daily (
+    product_id INT NOT NULL,
+    price_day DATE NOT NULL,
+    special_min DECIMAL(10,2),
+    special_max DECIMAL(10,2),
+    special_sum DECIMAL(14,2) NOT NULL DEFAULT 0,
+    special_count INT NOT NULL DEFAULT 0,
+    regular_min DECIMAL(10,2) NOT NULL,
+    regular_max DECIMAL(10,2) NOT NULL,
+    regular_sum DECIMAL(14,2) NOT NULL DEFAULT 0,
+    regular_count INT NOT NULL DEFAULT 0,
+    special_last DECIMAL(10,2),
+    regular_last DECIMAL(10,2) NOT NULL,
+    campaign BOOLEAN NOT NULL DEFAULT FALSE,
+    last_seen DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (product_id, price_day),
+    FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
+)
+DEFAULT CHARSET=utf8mb4
+COLLATE=utf8mb4_unicode_ci;
+
+CREATE TABLE product_matches (
+    product_id INT PRIMARY KEY,
+    group_id INT NOT NULL,
+    matched_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX product_matches_group_idx (group_id),
+    FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
+)
+DEFAULT CHARSET=utf8mb4
+COLLATE=utf8mb4_unicode_ci;
@@ -1,12 +1,167 @@
 import os
+import sys
 import json
+import time
 import pymysql
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+from pymysql.constants import ER
 from utils.logger import logger
-from messaging.consumer import start_consumers
+from database.bulk import BulkWriter
+from messaging.consumer import start_consumers, start_workers, get_markets, RequeueError
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Lookups and updates by key are split into IN lists of this size
+LOOKUP_CHUNK = 1000
+
+class LRUCache:
+    """
+    LRU cache whose writes inside a transaction are kept as pending until commit,
+    so a rollback cannot leave values that were never stored.
+
+    Pending writes belong to the calling thread, so consumer workers sharing the
+    cache only ever commit or roll back their own transaction's values.
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    @property
+    def pending(self):
+        if not hasattr(self.local, "pending"):
+            self.local.pending = {}
+        return self.local.pending
+
+    def get(self, key):
+        pending = self.pending
+        if key in pending:
+            return pending[key]
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.pending[key] = value
+
+    def store(self, key, value):
+        with self.lock:
+            self.insert(key, value)
+
+    def insert(self, key, value):
+        self.items[key] = value
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_size:
+            self.items.popitem(last=False)
+
+    def commit(self):
+        pending = self.pending
+        with self.lock:
+            for key, value in pending.items():
+                self.insert(key, value)
+        pending.clear()
+
+    def rollback(self):
+        self.pending.clear()
+
+product_cache = LRUCache(int(os.getenv("PRODUCT_CACHE_SIZE", 500000)))
+price_cache = LRUCache(int(os.getenv("PRICE_CACHE_SIZE", 500000)))
+
+# Attempts to restore a lost MySQL connection before a message is requeued
+RECONNECT_ATTEMPTS = int(os.getenv("DB_RECONNECT_ATTEMPTS", 3))
+
+# Skip 'prices' rows whose price state did not change since the last observation
+PRICE_DEDUP = os.getenv("PRICE_DEDUP", "true").lower() == "true"
+
+# Fold every price observation into the 'price_daily' rollup used by /api/history/
+PRICE_ROLLUP = os.getenv("PRICE_ROLLUP", "true").lower() == "true"
+
+ROLLUP_COLUMNS = (
+    "product_id", "price_day",
+    "special_min", "special_max", "special_sum", "special_count",
+    "regular_min", "regular_max", "regular_sum", "regular_count",
+    "special_last", "regular_last", "campaign", "last_seen"
+)
+
+# Assignments run left to right, so the *_last columns compare against last_seen before it is updated.
+# Existing-row columns are qualified because the bulk load path runs this as INSERT ... SELECT,
+# where MySQL rejects them as ambiguous with the staging table's columns
+ROLLUP_UPDATE = (
+    "special_min = LEAST(COALESCE(price_daily.special_min, VALUES(special_min)), "
+    "COALESCE(VALUES(special_min), price_daily.special_min)), "
+    "special_max = GREATEST(COALESCE(price_daily.special_max, VALUES(special_max)), "
+    "COALESCE(VALUES(special_max), price_daily.special_max)), "
+    "special_sum = price_daily.special_sum + VALUES(special_sum), "
+    "special_count = price_daily.special_count + VALUES(special_count), "
+    "regular_min = LEAST(price_daily.regular_min, VALUES(regular_min)), "
+    "regular_max = GREATEST(price_daily.regular_max, VALUES(regular_max)), "
+    "regular_sum = price_daily.regular_sum + VALUES(regular_sum), "
+    "regular_count = price_daily.regular_count + VALUES(regular_count), "
+    "special_last = IF(VALUES(last_seen) >= price_daily.last_seen, VALUES(special_last), price_daily.special_last), "
+    "regular_last = IF(VALUES(last_seen) >= price_daily.last_seen, VALUES(regular_last), price_daily.regular_last), "
+    "campaign = GREATEST(price_daily.campaign, VALUES(campaign)), "
+    "last_seen = GREATEST(price_daily.last_seen, VALUES(last_seen))"
+)
+
+def warm_product_cache(market, cursor):
+    """
+    Load up to the cache size product ids of a market into the product cache.
+    """
+    cursor.execute(
+        "SELECT product_name, product_id FROM products WHERE market = %s LIMIT %s",
+        (market, product_cache.max_size)
+    )
+    for product_name, product_id in cursor.fetchall():
+        product_cache.store((market, product_name), product_id)
+    logger.info(f"(✓) Product cache warmed: {market} - count={cursor.rowcount}")
+
+def price_state(special_price, regular_price, campaign):
+    """
+    Normalize a price observation so scraped floats compare equal to stored DECIMAL(10,2) values.
+    """
+    def to_decimal(value):
+        if value is None:
+            return None
+        return Decimal(str(value)).quantize(Decimal("0.01"))
+
+    return (to_decimal(special_price), to_decimal(regular_price), campaign)
+
+def is_connection_error(error):
+    """
+    True for MySQL errors caused by the connection or the server, not by the data:
+    a lost connection, a restart, a deadlock or a lock wait timeout
+    """
+    if isinstance(error, pymysql.InterfaceError):
+        return True
+    return isinstance(error, pymysql.OperationalError) and error.args[0] != ER.CONSTRAINT_FAILED
+
+def reconnect(db):
+    """
+    Reconnect a connection that was lost, e.g. to a MySQL restart or to wait_timeout
+    between crawls. Tries RECONNECT_ATTEMPTS times with a doubling delay.
+
+    Returns:
+        bool: True when the connection is usable again
+    """
+    delay = 1
+    for attempt in range(1, RECONNECT_ATTEMPTS + 1):
+        try:
+            db.ping(reconnect=True)
+            logger.info("(✓) Reconnected to MySQL database")
+            return True
+        except Exception as e:
+            logger.error(f"(✗) MySQL reconnect {attempt}/{RECONNECT_ATTEMPTS} failed: {e}")
+            if attempt < RECONNECT_ATTEMPTS:
+                time.sleep(delay)
+                delay *= 2
+    return False
+
 def connection():
     """
     Establish a connection to the MySQL database using environment variables.
@@ -20,6 +175,7 @@ def connection():
             charset=os.getenv("MYSQL_CHARSET"),
             collation=os.getenv("MYSQL_COLLATION"),
             autocommit=False,
+            local_infile=True,
             init_command='SET NAMES utf8mb4 COLLATE utf8mb4_unicode_ci'
         )
         logger.info("(✓) Connected to MySQL database")
@@ -29,10 +185,92 @@ def connection():
 
     return None, None
 
+def write_message(market, topic, data, cursor):
+    """
+    Insert a single message's data into MySQL without committing.
+
+    Args:
+        market (str): Market name
+        topic (str): 'product' or 'price'
+        data (dict): Messages
+        cursor (pymysql): Database cursor
+    """
+    if topic == "product":
+        product_data = []
+        for item in data:
+            product_data.append((
+               item["product_name"],
+               item["brand"],
+               item["market"],
+               item["product_image"],
+               item["tags"]
+            ))
+        insert_products(product_data, cursor)
+        logger.info(f"(✓)📦 Product inserted: {market} - count={len(product_data)}")
+
+    elif topic == "price":
+        product_keys = []
+        price_rows = []
+        for item in data:
+
+            if item.get("campaign"):
+                campaign = json.dumps(item["campaign"], ensure_ascii=False)
+            else:
+                campaign = None
+
+            product_keys.append((item["product_name"], item["market"]))
+            price_rows.append((
+                item["special_price"],
+                item["regular_price"],
+                campaign
+            ))
+        insert_prices(product_keys, price_rows, cursor)
+        logger.info(f"(✓)💸 Prices inserted: {market} - count={len(price_rows)}")
+
+    else:
+        logger.warning(f"(?) Unknown queue: {topic}, data: {data}")
+
+def bump_versions(markets, cursor):
+    """
+    Increase the data version of the given markets in the 'data_versions' table.
+
+    Runs inside the writing transaction, so the API cache sees the new version
+    exactly when the data becomes visible.
+    """
+    for market in sorted(set(markets)):
+        cursor.execute(
+            """
+            INSERT INTO data_versions (market, version) VALUES (%s, 1)
+            ON DUPLICATE KEY UPDATE version = version + 1, updated_at = NOW()
+            """,
+            (market,)
+        )
+
+def rollback(db, error):
+    """
+    Roll back the failed transaction and re-raise its error, as RequeueError when
+    the connection was lost so the message is not counted as a failed retry.
+    """
+    product_cache.rollback()
+    price_cache.rollback()
+    if is_connection_error(error):
+        try:
+            db.rollback()
+        except Exception:
+            pass
+        reconnect(db)
+        raise RequeueError(f"MySQL connection error: {error}") from error
+    db.rollback()
+    raise error
+
 def process_message(market, topic, data: dict, db, cursor):
     """
     Process RabbitMQ messages and insert data into MySQL.
 
+    Raises after rollback so the consumer retries the message and
+    finally dead letters it instead of acking lost data. Connection errors
+    reconnect and raise RequeueError, they do not count as a retry.
+
     Args:
         market (str): Market name
         topic (str): 'product' or 'price'
@@ -41,45 +279,39 @@ def process_message(market, topic, data: dict, db, cursor):
         cursor (pymysql): Database cursor
     """
     try:
-        if topic == "product":
-            product_data = []
-            for item in data:
-                product_data.append((
-                   item["product_name"],
-                   item["brand"],
-                   item["market"],
-                   item["product_image"],
-                   item["tags"]
-                ))
-            insert_products(product_data, cursor)
-            logger.info(f"(✓)📦 Product inserted: {market} - count={len(product_data)}")
-
-        elif topic == "price":
-            product_keys = []
-            price_rows = []
-            for item in data:
-
-                if item.get("campaign"):
-                    campaign = json.dumps(item["campaign"], ensure_ascii=False)
-                else:
-                    campaign = None
-
-                product_keys.append((item["product_name"], item["market"]))
-                price_rows.append((
-                    item["special_price"],
-                    item["regular_price"],
-                    campaign
-                ))
-            insert_prices(product_keys, price_rows, cursor)
-            logger.info(f"(✓)💸 Prices inserted: {market} - count={len(price_rows)}")
-
-        else:
-            logger.warning(f"(?) Unknown queue: {topic}, data: {data}")
-
+        write_message(market, topic, data, cursor)
+        bump_versions([market], cursor)
         db.commit()  
+        product_cache.commit()
+        price_cache.commit()
     except Exception as e:
         logger.error(f"(✗) Error inserting data from {topic}: {e}")
-        db.rollback()  
+        rollback(db, e)
+
+def process_batch(messages, db, cursor):
+    """
+    Insert a batch of RabbitMQ messages into MySQL in a single transaction.
+
+    Product messages are written before price messages so prices of products
+    arriving in the same batch can be mapped. Raises after rollback so the
+    consumer can fall back to message granularity, or RequeueError after
+    reconnecting when the connection was lost.
+
+    Args:
+        messages (list of tuple): Each tuple contains (market, topic, data)
+        db (pymysql): Database connection
+        cursor (pymysql): Database cursor
+    """
+    try:
+        for market, topic, data in sorted(messages, key=lambda message: message[1] != "product"):
+            write_message(market, topic, data, cursor)
+        bump_versions([market for market, topic, data in messages], cursor)
+        db.commit()
+        product_cache.commit()
+        price_cache.commit()
+        logger.info(f"(✓) Batch committed: {len(messages)} messages")
+    except Exception as e:
+        rollback(db, e)
 
 def insert_products(product_data, cursor):
     """
@@ -89,15 +321,6 @@ def insert_products(product_data, cursor):
     product_data (list of tuple): Each tuple contains:
         (product_name, brand, market, product_image, tags)
     """
-    insert_query = """
-        INSERT INTO products (product_name, brand, market, product_image, tags)
-        VALUES (%s, %s, %s, %s, %s)
-        ON DUPLICATE KEY UPDATE
-            brand = VALUES(brand),
-            product_image = VALUES(product_image),
-            tags = VALUES(tags)
-    """
-    
     values = []
     for product_name, brand, market, product_image, tags in product_data:
         values.append((
@@ -108,54 +331,201 @@ def insert_products(product_data, cursor):
             json.dumps(tags, ensure_ascii=False)
         ))
 
-    cursor.executemany(insert_query, values)
+    BulkWriter(cursor).write(
+        "products",
+        ("product_name", "brand", "market", "product_image", "tags"),
+        values,
+        on_duplicate="brand = VALUES(brand), product_image = VALUES(product_image), tags = VALUES(tags)"
+    )
+
+    # product_id never changes on upsert, so only products new to the cache are looked up
+    missing = []
+    for product_name, brand, market, product_image, tags in product_data:
+        if product_cache.get((market, product_name)) is None:
+            missing.append((product_name, market))
+    lookup_product_ids(missing, cursor)
+
+def lookup_product_ids(product_keys, cursor):
+    """
+    Fetch product ids from the 'products' table and put them into the product cache.
+
+    Args:
+        product_keys (list of tuple): Each tuple contains (product_name, market)
+    """
+    names_by_market = {}
+    for product_name, market in product_keys:
+        names_by_market.setdefault(market, set()).add(product_name)
+
+    for market, names in names_by_market.items():
+        names = list(names)
+        for start in range(0, len(names), LOOKUP_CHUNK):
+            chunk = names[start:start + LOOKUP_CHUNK]
+            placeholders = ",".join(["%s"] * len(chunk))
+            cursor.execute(
+                f"""
+                SELECT product_name, product_id
+                FROM products
+                WHERE market = %s AND product_name IN ({placeholders})
+                """,
+                [market, *chunk]
+            )
+            for product_name, product_id in cursor.fetchall():
+                product_cache.put((market, product_name), product_id)
+
+def lookup_price_states(product_ids, cursor):
+    """
+    Fetch the latest price state of products from the 'latest_prices' table
+    and put them into the price cache.
+
+    Args:
+        product_ids (list of int): Product ids missing from the price cache
+    """
+    for start in range(0, len(product_ids), LOOKUP_CHUNK):
+        chunk = product_ids[start:start + LOOKUP_CHUNK]
+        placeholders = ",".join(["%s"] * len(chunk))
+        cursor.execute(
+            f"""
+            SELECT product_id, special_price, regular_price, campaign
+            FROM latest_prices
+            WHERE product_id IN ({placeholders})
+            """,
+            chunk
+        )
+        for product_id, special_price, regular_price, campaign in cursor.fetchall():
+            price_cache.put(product_id, price_state(special_price, regular_price, campaign))
 
 def insert_prices(product_data, price_data, cursor):
     """
-    Insert prices for products into the 'prices' table.
+    Insert prices for products into the 'prices' table and keep 'latest_prices' up to date.
 
     Args:
         product_data (list of tuple): Each tuple contains (product_name, market)
         price_data (list of tuple): Each tuple contains (special_price, regular_price, campaign)
 
-    Maps product_name and market to product_id in the 'products' table.
-    Only inserts prices for products that exist in the database.
-    """
+    Maps product_name and market to product_id through the product cache,
+    only cache misses are looked up in the 'products' table.
+    Raises LookupError when a product is not in the database yet, e.g. its product
+    message is still being written by another worker, so the message is retried later.
 
-    placeholders = ",".join(["(%s, %s)"] * len(product_data))
-    values = []
+    If PRICE_DEDUP is enabled, a 'prices' row is only inserted when the price state
+    differs from the latest one, otherwise only 'latest_prices.last_seen' is updated.
+    """
+    missing = []
     for product_name, market in product_data:
-        values.extend([product_name, market])
+        if product_cache.get((market, product_name)) is None:
+            missing.append((product_name, market))
+    lookup_product_ids(missing, cursor)
+    
+    states = {}
+    unknown = []
+    for (product_name, market), (special_price, regular_price, campaign) in zip(product_data, price_data):
+        product_id = product_cache.get((market, product_name))
+        if product_id is None:
+            unknown.append(product_name)
+        else:
+            states[product_id] = (special_price, regular_price, campaign)
+    if unknown:
+        raise LookupError(f"{len(unknown)} products not found, e.g. {unknown[0]!r}")
 
-    query = f"""
-        SELECT product_name, market, product_id
-        FROM products
-        WHERE (product_name, market) IN ({placeholders})
-    """
-    cursor.execute(query, values)
-    results = cursor.fetchall()
+    lookup_price_states([product_id for product_id in states if price_cache.get(product_id) is None], cursor)
 
-    pairs = {}
-    for product_name, market, product_id in results:
-        pairs[(product_name, market)] = product_id  
-    
     price_values = []
-    for (product_name, market), (special_price, regular_price, campaign) in zip(product_data, price_data):
-        product_id = pairs.get((product_name, market))
-        if product_id is not None:
-            price_values.append((
-                product_id,
-                special_price,
-                regular_price,
-                campaign
-            ))
+    changed_values = []
+    unchanged_ids = []
+    for product_id, (special_price, regular_price, campaign) in states.items():
+        state = price_state(special_price, regular_price, campaign)
+        row = (product_id, special_price, regular_price, campaign)
+
+        if price_cache.get(product_id) == state:
+            unchanged_ids.append(product_id)
+            if not PRICE_DEDUP:
+                price_values.append(row)
+        else:
+            changed_values.append(row)
+            price_values.append(row)
+            price_cache.put(product_id, state)
+
+    writer = BulkWriter(cursor)
+    writer.write(
+        "prices",
+        ("product_id", "special_price", "regular_price", "campaign"),
+        price_values
+    )
+    writer.write(
+        "latest_prices",
+        ("product_id", "special_price", "regular_price", "campaign"),
+        changed_values,
+        on_duplicate=(
+            "special_price = VALUES(special_price), regular_price = VALUES(regular_price), "
+            "campaign = VALUES(campaign), changed_at = NOW(), last_seen = NOW()"
+        )
+    )
+    for start in range(0, len(unchanged_ids), LOOKUP_CHUNK):
+        chunk = unchanged_ids[start:start + LOOKUP_CHUNK]
+        placeholders = ",".join(["%s"] * len(chunk))
+        cursor.execute(
+            f"UPDATE latest_prices SET last_seen = NOW() WHERE product_id IN ({placeholders})",
+            chunk
+        )
+
+    if unchanged_ids:
+        logger.info(f"(✓) Unchanged prices: count={len(unchanged_ids)}")
+
+    if PRICE_ROLLUP:
+        update_rollup(states, cursor)
+
+def update_rollup(states, cursor):
+    """
+    Fold price observations into the daily 'price_daily' rollup.
+
+    Every observation counts, including unchanged ones skipped by PRICE_DEDUP,
+    so averages are per crawl rather than per price change.
 
-    if price_values:
-        insert_query = """
-            INSERT INTO prices (product_id, special_price, regular_price, campaign)
-            VALUES (%s, %s, %s, %s)
-        """
-        cursor.executemany(insert_query, price_values)
+    Args:
+        states (dict): product_id -> (special_price, regular_price, campaign)
+    """
+    if not states:
+        return
+
+    # Same clock as the DEFAULT CURRENT_TIMESTAMP of 'prices'
+    cursor.execute("SELECT NOW()")
+    now = cursor.fetchone()[0]
+
+    rows = []
+    for product_id, values in states.items():
+        special_price, regular_price, campaign = price_state(*values)
+        if regular_price is None:
+            continue
+        rows.append((
+            product_id, now.date(),
+            special_price, special_price, special_price or 0, int(special_price is not None),
+            regular_price, regular_price, regular_price, 1,
+            special_price, regular_price, int(campaign is not None), now
+        ))
+
+    BulkWriter(cursor).write("price_daily", ROLLUP_COLUMNS, rows, on_duplicate=ROLLUP_UPDATE)
+
+def worker_handlers():
+    """
+    Handler factory for consumer workers: every worker gets its own database connection.
+
+    Returns (user_callback, batch_callback, close)
+    """
+    db, cursor = connection()
+    if db is None or cursor is None:
+        raise RuntimeError("no database connection")
+
+    def wrapper(market, topic, data):
+        return process_message(market, topic, data, db, cursor)
+
+    def batch_wrapper(messages):
+        return process_batch(messages, db, cursor)
+
+    def close():
+        cursor.close()
+        db.close()
+
+    return wrapper, batch_wrapper, close
 
 if __name__ == "__main__":
     
@@ -163,11 +533,24 @@ if __name__ == "__main__":
     if db is None or cursor is None:
         logger.error("(✗) Consumers cannot be started without a database connection.")
     else:
-        def wrapper(market, topic, data):
-            return process_message(market, topic, data, db, cursor)
-        
-        start_consumers(wrapper)
+        for market in get_markets():
+            warm_product_cache(market, cursor)
+        db.commit()
 
-        cursor.close()
-        db.close()
-        
\ No newline at end of file
+        if int(os.getenv("CONSUMER_WORKERS", 1)) > 1:
+            cursor.close()
+            db.close()
+            if not start_workers(worker_handlers):
+                # Lets the container restart the consumer
+                sys.exit(1)
+        else:
+            def wrapper(market, topic, data):
+                return process_message(market, topic, data, db, cursor)
+
+            def batch_wrapper(messages):
+                return process_batch(messages, db, cursor)
+
+            start_consumers(wrapper, batch_wrapper)
+
+            cursor.close()
+            db.close()
@@ -0,0 +1,60 @@
+import os
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry, make_headers
+from dotenv import load_dotenv
+from utils.ratelimit import RateLimiter
+
+load_dotenv()
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class HttpClient:
+    """
+    Pooled requests.Session shared by the requests based scrapers.
+
+    Connections are kept alive per host, at most "pool_size" connections are
+    opened to a single host and 429/5xx responses are retried with jittered
+    exponential backoff. With a "rate", requests of all threads sharing the
+    client are spaced to at most that many per second.
+    """
+    def __init__(self, headers=None, pool_size=None, retries=None, backoff=None, timeout=None, rate=0):
+        self.pool_size = pool_size or int(os.getenv("HTTP_POOL_SIZE", 10))
+        self.timeout = timeout or float(os.getenv("HTTP_TIMEOUT", 30))
+        retries = retries if retries is not None else int(os.getenv("HTTP_RETRIES", 3))
+        backoff = backoff if backoff is not None else float(os.getenv("HTTP_BACKOFF", 0.5))
+        self.rate_limiter = RateLimiter(rate)
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            backoff_jitter=backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(["GET", "HEAD"]),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            pool_block=True,
+            max_retries=retry
+        )
+
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # gzip/deflate always, br/zstd when the decoder packages are installed
+        self.session.headers.update(make_headers(keep_alive=True, accept_encoding=True))
+        if headers:
+            self.session.headers.update(headers)
+
+    def get(self, url, **kwargs):
+        """Sends a GET request through the pooled session with the default timeout"""
+        kwargs.setdefault("timeout", self.timeout)
+        self.rate_limiter.wait()
+        return self.session.get(url, **kwargs)
+
+    def close(self):
+        self.session.close()
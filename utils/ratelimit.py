@@ -0,0 +1,49 @@
+import time
+import asyncio
+import threading
+
+
+class AsyncRateLimiter:
+    """
+    Spaces out acquisitions shared by many asyncio tasks to at most "rate" per second.
+
+    A rate of 0 or less disables limiting.
+    """
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next_time = 0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+
+        async with self.lock:
+            now = time.monotonic()
+            if self.next_time > now:
+                await asyncio.sleep(self.next_time - now)
+                now = self.next_time
+            self.next_time = now + self.interval
+
+
+class RateLimiter:
+    """
+    Thread-safe counterpart of AsyncRateLimiter for the requests based scrapers.
+
+    A rate of 0 or less disables limiting.
+    """
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next_time = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            if self.next_time > now:
+                time.sleep(self.next_time - now)
+                now = self.next_time
+            self.next_time = now + self.interval